@@ -0,0 +1,67 @@
+"""Compare two result files of benchmarks/run.py.
+
+    python benchmarks/compare.py before.json after.json [--threshold 1.2]
+
+Prints the ratio after/before of each metric, and flags regressions beyond
+the threshold. Exits with status 1 if there is any.
+"""
+import argparse
+import json
+import sys
+
+# metrics where larger values are better
+HIGHER_IS_BETTER = ("docs_per_s",)
+# metrics that are not measurements, or too noisy to compare
+IGNORED = ("n", "matches", "max_ms")
+
+
+def flatten(results, prefix=""):
+    metrics = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and name not in IGNORED:
+            metrics[prefix + name] = value
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before["meta"]["parameters"] != after["meta"]["parameters"]:
+        print("warning: the runs have different parameters", file=sys.stderr)
+
+    before = flatten(before["results"])
+    after = flatten(after["results"])
+    regressions = 0
+    width = max(map(len, after), default=0)
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        if not old or not new:
+            continue
+        # ratio above 1 when worse
+        if name.endswith(HIGHER_IS_BETTER):
+            ratio = old / new
+        else:
+            ratio = new / old
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 / args.threshold:
+            flag = "  improvement"
+        print(f"{name:<{width}}  {old:>14.4g}  {new:>14.4g}  "
+              f"{ratio:>6.2f}x{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
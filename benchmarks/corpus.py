@@ -0,0 +1,59 @@
+import numpy as np
+
+# parameters of the default corpus
+N_DOCS = 100000
+DOC_LENGTH = 60
+VOCABULARY_SIZE = 50000
+ZIPF_EXPONENT = 1.1
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "de", "gan", "dor",
+    "el", "fro", "bag", "rin", "mor", "th", "an", "il", "ar", "go", "nd"]
+
+
+def vocabulary(size=VOCABULARY_SIZE, seed=0):
+    # distinct pseudo-words, ranked from the most to the least frequent.
+    # Frequent words are short, as in natural languages
+    rng = np.random.default_rng(seed)
+    words = []
+    seen = set()
+    n_syllables = 1
+    while len(words) < size:
+        # a word length is used until most of its words are taken
+        for _ in range(4 * len(SYLLABLES) ** n_syllables):
+            word = "".join(rng.choice(SYLLABLES, n_syllables))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+                if len(words) == size:
+                    break
+        n_syllables += 1
+    return words
+
+
+def documents(
+    n_docs=N_DOCS,
+    doc_length=DOC_LENGTH,
+    vocabulary_size=VOCABULARY_SIZE,
+    exponent=ZIPF_EXPONENT,
+    seed=0
+):
+    # deterministic documents of words drawn from a Zipfian distribution,
+    # with lengths varying around `doc_length`
+    words = np.array(vocabulary(vocabulary_size, seed), dtype=object)
+    rng = np.random.default_rng(seed)
+    probabilities = 1 / np.arange(1, vocabulary_size + 1) ** exponent
+    probabilities /= probabilities.sum()
+    lengths = rng.integers(doc_length // 2, doc_length * 3 // 2 + 1, n_docs)
+    tokens = words[rng.choice(
+        vocabulary_size, lengths.sum(), p=probabilities)]
+    # some words are capitalized or accented, for the analyzers
+    capitalized = rng.random(len(tokens)) < 0.05
+    tokens[capitalized] = [word.capitalize() for word in tokens[capitalized]]
+    accented = rng.random(len(tokens)) < 0.01
+    tokens[accented] = [word.replace("e", "é") for word in tokens[accented]]
+
+    ends = np.cumsum(lengths)
+    return [
+        " ".join(tokens[end - length:end])
+        for end, length in zip(ends.tolist(), lengths.tolist())]
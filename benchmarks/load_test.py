@@ -0,0 +1,198 @@
+"""Load test of the eldar HTTP server.
+
+    python benchmarks/load_test.py --docs 100000 --concurrency 32
+    python benchmarks/load_test.py --port 8080 --duration 30
+
+Without --port, an index of a synthetic corpus is built and served by a
+server process started for the test. Clients keep their connection open
+and send queries back to back; throughput and latency percentiles are
+printed as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+import corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_queries(words, n, seed):
+    # a mix of terms, conjunctions, unions, wildcards and ranked pages
+    rng = np.random.default_rng(seed)
+    medium = words[100:5000]
+    queries = []
+    for _ in range(n):
+        a, b, c = rng.choice(medium, 3).tolist()
+        kind = rng.integers(5)
+        if kind == 0:
+            queries.append(f"/search?q={quote(a)}&limit=10")
+        elif kind == 1:
+            queries.append(f"/search?q={quote(f'{a} AND {words[0]}')}"
+                           "&limit=10")
+        elif kind == 2:
+            queries.append(f"/count?q={quote(f'{a} OR {b} OR {c}')}")
+        elif kind == 3:
+            queries.append(f"/count?q={quote(f'{a[:3]}*')}")
+        else:
+            queries.append(
+                f"/search?q={quote(f'{a} OR {b}')}&rank=1&limit=10")
+    return queries
+
+
+async def request(reader, writer, host, target):
+    # status line of the response to a GET request, whose body is skipped
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, queries, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await request(
+                reader, writer, host, queries[i % len(queries)])
+            latencies.append(time.perf_counter() - start)
+            if b" 200 " not in status:
+                errors.append(status.decode().strip())
+            i += 1
+    finally:
+        writer.close()
+
+
+async def health(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return b" 200 " in await request(reader, writer, host, "/health")
+    finally:
+        writer.close()
+
+
+async def run(host, port, queries, concurrency, duration):
+    latencies, errors = [], []
+    rng = np.random.default_rng(0)
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, list(rng.permutation(queries)), deadline,
+               latencies, errors)
+        for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_s": len(latencies) / elapsed,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max())
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(path, port, workers):
+    # server process on a saved index, ready once /health answers
+    server = subprocess.Popen(
+        [sys.executable, "-m", "eldar.server", path, "--port", str(port),
+         "--workers", str(workers)],
+        cwd=ROOT, stdout=subprocess.DEVNULL)
+    for _ in range(600):
+        if server.poll() is not None:
+            break
+        try:
+            if asyncio.run(health("127.0.0.1", port)):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("the server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, help="port of a running server")
+    parser.add_argument("--docs", type=int, default=corpus.N_DOCS)
+    parser.add_argument("--vocabulary", type=int,
+                        default=corpus.VOCABULARY_SIZE)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="query threads of the started server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json file of the results")
+    args = parser.parse_args(argv)
+
+    words = corpus.vocabulary(args.vocabulary, args.seed)
+    queries = make_queries(words, args.queries, args.seed)
+    server, path = None, None
+    port = args.port
+    try:
+        if port is None:
+            from eldar import Index
+
+            path = tempfile.mkdtemp(prefix="eldar-load-")
+            index = Index()
+            index.build(corpus.documents(
+                args.docs, vocabulary_size=args.vocabulary, seed=args.seed))
+            index.save(os.path.join(path, "index"))
+            port = free_port()
+            server = start_server(
+                os.path.join(path, "index"), port, args.workers)
+        results = asyncio.run(run(
+            args.host, port, queries, args.concurrency, args.duration))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if path is not None:
+            shutil.rmtree(path)
+
+    results["parameters"] = {
+        "docs": args.docs if args.port is None else None,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "workers": args.workers if args.port is None else None
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Benchmarks of Query and Index on a synthetic corpus.
+
+    python benchmarks/run.py --docs 100000 --output results.json
+    python benchmarks/compare.py before.json after.json
+
+With --compress, the index stores its postings as compressed blocks: compare
+a run with and without it for the size, build time and latency of each
+representation.
+
+The corpus and the queries only depend on the parameters and the seed, so
+results of different versions (or machines) can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import corpus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import eldar  # noqa: E402
+from eldar import Index, Query  # noqa: E402
+
+SECTIONS = ("query", "build", "search", "storage")
+# number of queries of each kind, and of documents filtered by Query
+N_QUERIES = 20
+N_FILTERED = 20000
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def latencies(function, queries, repeat):
+    # percentiles in milliseconds of the calls of `function` on each query
+    times = []
+    for query in queries:
+        for _ in range(repeat):
+            times.append(timed(function, query)[0])
+    times = np.array(times) * 1000
+    return {
+        "n": len(times),
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "max_ms": float(times.max())
+    }
+
+
+def make_queries(documents, words, seed):
+    # queries of each kind, drawn from the corpus so that most have matches
+    rng = np.random.default_rng(seed)
+    common = words[:20]
+    medium = words[100:1000]
+    rare = words[5000:20000]
+
+    def pick(pool, n=N_QUERIES):
+        return [str(word) for word in rng.choice(pool, n)]
+
+    def phrase(length):
+        tokens = documents[rng.integers(len(documents))].split()
+        start = rng.integers(len(tokens) - length)
+        return '"' + " ".join(tokens[start:start + length]) + '"'
+
+    def boolean(depth):
+        if depth == 0:
+            return pick(medium + rare, 1)[0]
+        operator = rng.choice(["AND", "OR", "AND NOT"])
+        return f"({boolean(depth - 1)}) {operator} ({boolean(depth - 1)})"
+
+    return {
+        "term_common": pick(common),
+        "term_medium": pick(medium),
+        "term_rare": pick(rare),
+        "and": [f"{a} AND {b}" for a, b in zip(pick(medium), pick(common))],
+        "or": [" OR ".join(pick(medium, 10)) for _ in range(N_QUERIES)],
+        "phrase": [phrase(rng.integers(2, 4)) for _ in range(N_QUERIES)],
+        "wildcard_prefix": [f'"{word[:3]}*"' for word in pick(medium)],
+        "wildcard_infix": [f'"*{word[1:4]}*"' for word in pick(medium)],
+        "boolean_deep": [boolean(4) for _ in range(N_QUERIES)]
+    }
+
+
+def bench_query(documents, queries, args):
+    # documents per second filtered by Query, with and without match_word
+    documents = documents[:N_FILTERED]
+    kinds = {
+        "plain": queries["boolean_deep"][:5],
+        "wildcard": queries["wildcard_prefix"][:5]
+    }
+    results = {}
+    for kind, texts in kinds.items():
+        for match_word in (True, False):
+            elapsed = 0
+            for text in texts:
+                query = Query(text, match_word=match_word)
+                elapsed += timed(query.filter, documents)[0]
+            name = f"{kind}_{'word' if match_word else 'substring'}"
+            results[name] = {
+                "docs_per_s": len(documents) * len(texts) / elapsed}
+    return results
+
+
+def bench_build(documents, args):
+    index = Index(compress=args.compress)
+    tracemalloc.start()
+    elapsed, _ = timed(index.build, documents, n_jobs=args.jobs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "docs_per_s": len(documents) / elapsed,
+        "peak_bytes": peak,
+        "postings_bytes": index.memory_usage()["postings"]
+    }
+
+
+def bench_search(index, queries, args):
+    results = {}
+    for kind, texts in queries.items():
+        results[kind] = latencies(
+            lambda text: index.search(text, return_ids=True), texts,
+            args.repeat)
+        results[kind]["matches"] = int(np.mean(
+            [index.count(text) for text in texts]))
+    return results
+
+
+def bench_storage(index, queries, args):
+    path = tempfile.mkdtemp(prefix="eldar-bench-")
+    try:
+        directory = os.path.join(path, "index")
+        save_time, _ = timed(index.save, directory)
+        load_time, loaded = timed(Index.load, directory)
+        first_query, _ = timed(
+            loaded.search, queries["term_medium"][0], return_ids=True)
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(directory) for name in names)
+    finally:
+        shutil.rmtree(path)
+    return {
+        "save_seconds": save_time,
+        "load_seconds": load_time,
+        "first_query_seconds": first_query,
+        "disk_bytes": size
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=corpus.N_DOCS)
+    parser.add_argument("--length", type=int, default=corpus.DOC_LENGTH)
+    parser.add_argument(
+        "--vocabulary", type=int, default=corpus.VOCABULARY_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="runs of each search")
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="processes of Index.build")
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="index with compressed postings")
+    parser.add_argument(
+        "--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument(
+        "--output", help="json file of the results (default: stdout)")
+    args = parser.parse_args(argv)
+
+    words = corpus.vocabulary(args.vocabulary, args.seed)
+    documents = corpus.documents(
+        args.docs, args.length, args.vocabulary, seed=args.seed)
+    queries = make_queries(documents, words, args.seed)
+
+    results = {}
+    if "query" in args.sections:
+        results["query"] = bench_query(documents, queries, args)
+    if "build" in args.sections:
+        results["build"] = bench_build(documents, args)
+    if {"search", "storage"} & set(args.sections):
+        # the result cache would only measure the first run of each query
+        index = Index(cache_size=0, compress=args.compress)
+        index.build(documents, n_jobs=args.jobs)
+        if "search" in args.sections:
+            results["search"] = bench_search(index, queries, args)
+        if "storage" in args.sections:
+            results["storage"] = bench_storage(index, queries, args)
+
+    report = {
+        "meta": {
+            "eldar": getattr(eldar, "__version__", None),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "parameters": {
+                "docs": args.docs,
+                "length": args.length,
+                "vocabulary": args.vocabulary,
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "jobs": args.jobs,
+                "compress": args.compress
+            }
+        },
+        "results": results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,4 @@
 from .query import Query
 from .index import Index
+from .percolator import QuerySet
+from .sharded import ShardedIndex
@@ -0,0 +1,80 @@
+import re
+from functools import lru_cache
+
+from unidecode import unidecode
+
+from .regex import WORD_REGEX
+
+PUNCTUATION = """'!#$%&\'()+,-./:;<=>?@[\\]^_`{|}~'"""
+# number of distinct non-ascii words whose transliteration is cached
+CACHE_SIZE = 1 << 16
+
+
+class Analyzer:
+    # text normalization and tokenization shared by Query and Index.
+    # Custom analyzers can be passed to both: they must implement
+    # `normalize` (applied to documents and query terms), `tokenize` (applied
+    # to normalized documents) and `strip_punctuation` (applied to tokens and
+    # query terms of an index)
+    def __init__(
+        self,
+        ignore_case=True,
+        ignore_accent=True,
+        ignore_punctuation=False,
+        cache_size=CACHE_SIZE
+    ):
+        self.ignore_case = ignore_case
+        self.ignore_accent = ignore_accent
+        self.ignore_punctuation = ignore_punctuation
+        self.cache_size = cache_size
+        self.tokenizer = re.compile(WORD_REGEX, re.UNICODE)
+        self.punctuation = str.maketrans('', '', PUNCTUATION)
+        self.transliterate = lru_cache(maxsize=cache_size)(unidecode)
+
+    def normalize(self, text):
+        if self.ignore_case:
+            text = text.lower()
+        if self.ignore_accent and not text.isascii():
+            # unidecode maps characters one by one, so words can be
+            # transliterated separately, and cached
+            transliterate = self.transliterate
+            text = " ".join([
+                word if word.isascii() else transliterate(word)
+                for word in text.split(" ")])
+        return text
+
+    def tokenize(self, text):
+        return self.tokenizer.findall(text)
+
+    def strip_punctuation(self, token):
+        if self.ignore_punctuation:
+            return token.translate(self.punctuation)
+        return token
+
+    def analyze(self, text):
+        tokens = self.tokenize(self.normalize(text))
+        if self.ignore_punctuation:
+            punctuation = self.punctuation
+            tokens = [token.translate(punctuation) for token in tokens]
+        return tokens
+
+    def __eq__(self, other):
+        # analyzers with the same settings share compiled queries
+        return (type(self) is type(other) and
+                self.settings() == other.settings())
+
+    def __hash__(self):
+        return hash((type(self), self.settings()))
+
+    def settings(self):
+        return (self.ignore_case, self.ignore_accent, self.ignore_punctuation)
+
+    def __getstate__(self):
+        # the cache is not sent to worker processes
+        state = self.__dict__.copy()
+        del state["transliterate"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.transliterate = lru_cache(maxsize=self.cache_size)(unidecode)
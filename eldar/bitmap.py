@@ -0,0 +1,68 @@
+import numpy as np
+
+from .postings import DOC_DTYPE
+
+# number of set bits of each byte value
+BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+
+class Bitmap:
+    # set of doc ids in [0, size) stored as one bit per document, so that
+    # boolean operations run 64 documents at a time
+    def __init__(self, words, size):
+        self.words = words
+        self.size = size
+
+    @staticmethod
+    def zeros(size):
+        return Bitmap(np.zeros((size + 63) // 64, dtype=np.uint64), size)
+
+    @staticmethod
+    def from_mask(mask):
+        size = len(mask)
+        padded = np.zeros(((size + 63) // 64) * 64, dtype=bool)
+        padded[:size] = mask
+        words = np.packbits(padded, bitorder="little").view("<u8")
+        return Bitmap(words.astype(np.uint64, copy=False), size)
+
+    @staticmethod
+    def from_ids(ids, size):
+        mask = np.zeros(size, dtype=bool)
+        mask[ids] = True
+        return Bitmap.from_mask(mask)
+
+    def to_mask(self):
+        bits = np.unpackbits(
+            self.words.astype("<u8", copy=False).view(np.uint8),
+            bitorder="little", count=self.size)
+        return bits.view(bool)
+
+    def to_ids(self):
+        return np.flatnonzero(self.to_mask()).astype(DOC_DTYPE)
+
+    def contains(self, ids):
+        ids = ids.astype(np.int64, copy=False)
+        bits = self.words[ids >> 6] >> (ids & 63).astype(np.uint64)
+        return (bits & np.uint64(1)).astype(bool)
+
+    def __len__(self):
+        return popcount(self.words)
+
+    def __and__(self, other):
+        return Bitmap(self.words & other.words, self.size)
+
+    def __or__(self, other):
+        return Bitmap(self.words | other.words, self.size)
+
+    def __sub__(self, other):
+        return Bitmap(self.words & ~other.words, self.size)
+
+    def __repr__(self):
+        return f"Bitmap({len(self)}/{self.size})"
+
+
+def popcount(words):
+    # number of set bits of an array of words
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(BYTE_POPCOUNT[words.view(np.uint8)].sum(dtype=np.int64))
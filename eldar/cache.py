@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+from .bitmap import Bitmap
+
+# default memory budget of the result cache of an index, in bytes
+CACHE_SIZE = 64 << 20
+
+
+class ResultCache:
+    # least recently used results of query sub-trees, keyed on their
+    # normalized form and bounded by the total size of the results. It can
+    # be shared by concurrent searches
+    def __init__(self, max_nbytes=CACHE_SIZE):
+        self.max_nbytes = max_nbytes
+        self.results = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            result = self.results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def put(self, key, result):
+        nbytes = result_nbytes(result)
+        if nbytes > self.max_nbytes:
+            return
+        # results are shared between queries, and must not be modified
+        if isinstance(result, Bitmap):
+            result.words.setflags(write=False)
+        else:
+            result.setflags(write=False)
+        with self.lock:
+            if key in self.results:
+                self.nbytes -= result_nbytes(self.results.pop(key))
+            self.results[key] = result
+            self.nbytes += nbytes
+            while self.nbytes > self.max_nbytes:
+                _, evicted = self.results.popitem(last=False)
+                self.nbytes -= result_nbytes(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.nbytes = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.results),
+            "nbytes": self.nbytes,
+            "max_nbytes": self.max_nbytes
+        }
+
+
+def result_nbytes(result):
+    if isinstance(result, Bitmap):
+        return result.words.nbytes
+    return result.nbytes
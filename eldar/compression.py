@@ -0,0 +1,322 @@
+import numpy as np
+
+from .postings import DOC_DTYPE, OFFSET_DTYPE, PostingList, Postings
+from .setops import contains
+
+# number of documents of a block, the unit of decoding
+BLOCK_SIZE = 128
+# arrays of BlockPostings, in the order of its constructor
+ARRAYS = [
+    "doc_offsets", "occurrence_offsets", "block_offsets", "block_last",
+    "doc_bytes", "doc_data", "tf_bytes", "tf_data", "pos_bytes", "pos_data"]
+
+
+class BlockPostings:
+    # posting lists stored as delta-encoded varints, in blocks of
+    # BLOCK_SIZE documents. A term has three byte streams, each split by
+    # block: the gaps between its doc ids, the number of positions in each
+    # document, and the gaps between positions in a document. The last doc
+    # id of every block is kept uncompressed, as a skip pointer: lookups of
+    # a few documents only decode the blocks that may hold them
+    def __init__(self, doc_offsets, occurrence_offsets, block_offsets,
+                 block_last, doc_bytes, doc_data, tf_bytes, tf_data,
+                 pos_bytes, pos_data):
+        self.doc_offsets = doc_offsets
+        self.occurrence_offsets = occurrence_offsets
+        self.block_offsets = block_offsets
+        self.block_last = block_last
+        self.doc_bytes = doc_bytes
+        self.doc_data = doc_data
+        self.tf_bytes = tf_bytes
+        self.tf_data = tf_data
+        self.pos_bytes = pos_bytes
+        self.pos_data = pos_data
+
+    @staticmethod
+    def from_postings(postings):
+        doc_offsets = np.asarray(postings.doc_offsets, dtype=OFFSET_DTYPE)
+        doc_offsets = doc_offsets - doc_offsets[0]
+        df = np.diff(doc_offsets)
+        n_terms, n_pairs = len(df), int(doc_offsets[-1])
+        block_offsets = np.zeros(n_terms + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(-(-df // BLOCK_SIZE), out=block_offsets[1:])
+
+        # rank of each (term, doc) pair among the docs of its term
+        term_starts = np.repeat(doc_offsets[:-1], df)
+        rank = np.arange(n_pairs, dtype=OFFSET_DTYPE) - term_starts
+        block_starts = np.flatnonzero(rank % BLOCK_SIZE == 0)
+        block_ends = np.append(block_starts[1:], n_pairs)[:len(block_starts)]
+
+        pos_offsets = np.asarray(postings.pos_offsets, dtype=OFFSET_DTYPE)
+        doc_ids = np.asarray(postings.doc_ids[
+            postings.doc_offsets[0]:postings.doc_offsets[-1]])
+        pos_offsets = pos_offsets[
+            postings.doc_offsets[0]:postings.doc_offsets[-1] + 1]
+        positions = np.asarray(
+            postings.positions[pos_offsets[0]:pos_offsets[-1]])
+        pos_offsets = pos_offsets - pos_offsets[0]
+
+        # gaps are taken from the previous document of the same term, so
+        # the first gap of a block follows the last doc of the previous one
+        doc_gaps = np.diff(doc_ids.astype(np.int64), prepend=0)
+        doc_gaps[rank == 0] = doc_ids[rank == 0]
+        doc_data, doc_sizes = varint_encode(doc_gaps)
+        tf = np.diff(pos_offsets)
+        tf_data, tf_sizes = varint_encode(tf)
+        pos_gaps = np.diff(positions.astype(np.int64), prepend=0)
+        pos_gaps[pos_offsets[:-1][tf > 0]] = positions[
+            pos_offsets[:-1][tf > 0]]
+        pos_data, pos_sizes = varint_encode(pos_gaps)
+
+        return BlockPostings(
+            doc_offsets,
+            pos_offsets[doc_offsets],
+            block_offsets,
+            doc_ids[block_ends - 1].astype(DOC_DTYPE),
+            byte_offsets(doc_sizes, np.append(block_starts, n_pairs)),
+            doc_data,
+            byte_offsets(tf_sizes, np.append(block_starts, n_pairs)),
+            tf_data,
+            byte_offsets(pos_sizes, pos_offsets[
+                np.append(block_starts, n_pairs)]),
+            pos_data)
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def __getitem__(self, term_id):
+        return BlockPostingList(self, term_id)
+
+    def blocks(self, term_id, doc_ids=None):
+        # blocks of a term, or only those that may hold the sorted doc_ids
+        first = int(self.block_offsets[term_id])
+        end = int(self.block_offsets[term_id + 1])
+        if doc_ids is None:
+            return np.arange(first, end)
+        idx = np.searchsorted(self.block_last[first:end], doc_ids)
+        return first + np.unique(idx[idx < end - first])
+
+    def block_sizes(self, term_id, blocks):
+        # number of documents of each block of a term
+        df = self.document_frequency(term_id)
+        first = self.block_offsets[term_id]
+        return np.minimum(BLOCK_SIZE, df - (blocks - first) * BLOCK_SIZE)
+
+    def decode_ids(self, term_id, blocks):
+        if len(blocks) == 0:
+            return np.empty(0, dtype=DOC_DTYPE)
+        first = self.block_offsets[term_id]
+        if blocks[-1] - blocks[0] + 1 == len(blocks):
+            # consecutive blocks: gaps run on from the first one
+            gaps = varint_decode(self.doc_data[
+                self.doc_bytes[blocks[0]]:self.doc_bytes[blocks[-1] + 1]])
+            if blocks[0] > first:
+                gaps[0] += self.block_last[blocks[0] - 1]
+            return np.cumsum(gaps).astype(DOC_DTYPE)
+        gaps = varint_decode(gather(
+            self.doc_data, self.doc_bytes[blocks], self.doc_bytes[blocks + 1]))
+        sizes = self.block_sizes(term_id, blocks)
+        starts = np.zeros(len(blocks), dtype=OFFSET_DTYPE)
+        np.cumsum(sizes[:-1], out=starts[1:])
+        # blocks restart from the last doc of the previous block
+        bases = np.where(
+            blocks > first, self.block_last[np.maximum(blocks - 1, 0)], 0)
+        gaps[starts] += bases
+        return segmented_cumsum(gaps, starts).astype(DOC_DTYPE)
+
+    def decode(self, term_id, blocks):
+        # posting list of the documents of the given blocks of a term
+        ids = self.decode_ids(term_id, blocks)
+        if len(ids) == 0:
+            return PostingList.empty()
+        tf = varint_decode(gather(
+            self.tf_data, self.tf_bytes[blocks], self.tf_bytes[blocks + 1]))
+        offsets = np.zeros(len(tf) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(tf, out=offsets[1:])
+        gaps = varint_decode(gather(
+            self.pos_data, self.pos_bytes[blocks], self.pos_bytes[blocks + 1]))
+        positions = segmented_cumsum(gaps, offsets[:-1])
+        return PostingList(ids, offsets, positions.astype(DOC_DTYPE))
+
+    def get_ids(self, term_id):
+        # the gaps of a term run on across its blocks
+        block_offsets = self.block_offsets
+        gaps = varint_decode(self.doc_data[
+            self.doc_bytes[block_offsets[term_id]]:
+            self.doc_bytes[block_offsets[term_id + 1]]])
+        return np.cumsum(gaps, dtype=DOC_DTYPE)
+
+    def get_many_ids(self, term_ids):
+        # ids of several terms, decoded together
+        if len(term_ids) == 1:
+            return [self.get_ids(term_ids[0])]
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        df = self.doc_offsets[term_ids + 1] - self.doc_offsets[term_ids]
+        gaps = varint_decode(gather(
+            self.doc_data, self.doc_bytes[self.block_offsets[term_ids]],
+            self.doc_bytes[self.block_offsets[term_ids + 1]]))
+        starts = np.zeros(len(term_ids), dtype=OFFSET_DTYPE)
+        np.cumsum(df[:-1], out=starts[1:])
+        ids = segmented_cumsum(gaps, starts[df > 0]).astype(DOC_DTYPE)
+        return np.split(ids, starts[1:])
+
+    def get_ids_within(self, term_id, doc_ids):
+        # the sorted doc_ids that hold the term
+        n_blocks = (
+            self.block_offsets[term_id + 1] - self.block_offsets[term_id])
+        blocks = None
+        if len(doc_ids) < n_blocks:
+            blocks = self.blocks(term_id, doc_ids)
+        if blocks is None or 2 * len(blocks) > n_blocks:
+            # most blocks are read anyway: decoding them in one run is faster
+            ids = self.get_ids(term_id)
+        else:
+            ids = self.decode_ids(term_id, blocks)
+        return doc_ids[contains(ids, doc_ids)]
+
+    def document_frequency(self, term_id):
+        return int(
+            self.doc_offsets[term_id + 1] - self.doc_offsets[term_id])
+
+    def document_frequencies(self):
+        return np.diff(self.doc_offsets)
+
+    def to_postings(self):
+        # uncompressed copy, to merge segments or count document lengths.
+        # Doc gaps run on across the blocks of a term, so all of them can
+        # be summed at once
+        df = np.diff(self.doc_offsets)
+        doc_ids = segmented_cumsum(
+            varint_decode(self.doc_data), self.doc_offsets[:-1][df > 0])
+        tf = varint_decode(self.tf_data)
+        pos_offsets = np.zeros(len(tf) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(tf, out=pos_offsets[1:])
+        positions = segmented_cumsum(
+            varint_decode(self.pos_data), pos_offsets[:-1])
+        return Postings(
+            self.doc_offsets, doc_ids.astype(DOC_DTYPE), pos_offsets,
+            positions.astype(DOC_DTYPE))
+
+    def occurrences(self):
+        return self.to_postings().occurrences()
+
+    def doc_lengths(self, n_docs):
+        return self.to_postings().doc_lengths(n_docs)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+
+class BlockPostingList:
+    # posting list of a term of BlockPostings, decoded on first access, or
+    # only in the blocks of the documents given to `restrict`
+    def __init__(self, postings, term_id):
+        self.postings = postings
+        self.term_id = term_id
+        self._decoded = None
+
+    def __len__(self):
+        return self.postings.document_frequency(self.term_id)
+
+    @property
+    def n_occurrences(self):
+        offsets = self.postings.occurrence_offsets
+        return int(offsets[self.term_id + 1] - offsets[self.term_id])
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            self._decoded = self.postings.decode(
+                self.term_id, self.postings.blocks(self.term_id))
+        return self._decoded
+
+    @property
+    def ids(self):
+        return self.decoded.ids
+
+    @property
+    def offsets(self):
+        return self.decoded.offsets
+
+    @property
+    def positions(self):
+        return self.decoded.positions
+
+    def get_positions(self, i):
+        return self.decoded.get_positions(i)
+
+    def occurrences(self):
+        return self.decoded.occurrences()
+
+    def restrict(self, doc_ids):
+        if self._decoded is not None:
+            return self._decoded.restrict(doc_ids)
+        blocks = self.postings.blocks(self.term_id, doc_ids)
+        return self.postings.decode(self.term_id, blocks).restrict(doc_ids)
+
+
+def varint_encode(values):
+    # LEB128 bytes of non-negative integers (7 bits per byte, the high bit
+    # set on all but the last byte of a value), and the size of each value
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.uint8)
+    for bits in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        sizes += values >= np.uint64(1 << bits)
+    starts = np.zeros(len(values), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=starts[1:])
+    data = np.empty(int(sizes.sum(dtype=np.int64)), dtype=np.uint8)
+    # k-th byte of the values that have more than k bytes
+    selected = np.arange(len(values))
+    for k in range(int(sizes.max(initial=0))):
+        selected = selected[sizes[selected] > k]
+        byte = (values[selected] & np.uint64(0x7F)).astype(np.uint8)
+        byte[sizes[selected] > k + 1] |= 0x80
+        data[starts[selected] + k] = byte
+        values = values >> np.uint64(7)
+    return data, sizes
+
+
+def varint_decode(data):
+    data = np.asarray(data)
+    if len(data) == 0 or data.max() < 0x80:
+        # small gaps: one byte per value
+        return data.astype(np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.zeros(len(ends), dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    values = (data & 0x7F).astype(np.int64) << shifts
+    return np.add.reduceat(values, starts)
+
+
+def byte_offsets(sizes, starts):
+    # offsets in the byte stream of the values at indexes `starts`
+    offsets = np.zeros(len(sizes) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum(sizes, out=offsets[1:])
+    return offsets[starts]
+
+
+def gather(data, starts, ends):
+    # concatenation of data[starts[i]:ends[i]]
+    if len(starts) == 0:
+        return data[:0]
+    if len(starts) == 1 or (starts[1:] == ends[:-1]).all():
+        return data[starts[0]:ends[-1]]
+    lengths = ends - starts
+    offsets = np.zeros(len(lengths), dtype=OFFSET_DTYPE)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    index = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+    return data[index]
+
+
+def segmented_cumsum(values, starts):
+    # cumulative sums restarting at each of the sorted `starts`, which begin
+    # at 0 and delimit non-empty segments. `values` is overwritten: the sum
+    # of each segment is subtracted from the start of the next one, so that
+    # a single pass computes all of them
+    if len(values) == 0:
+        return values
+    sums = np.add.reduceat(values, starts)
+    values[starts[1:]] -= sums[:-1]
+    return np.cumsum(values, out=values)
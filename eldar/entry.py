@@ -1,7 +1,6 @@
 import re
-from collections import defaultdict
-from dataclasses import dataclass
 
+from .postings import phrase_ids, phrase_starts
 from .regex import WILD_CARD_REGEX
 
 
@@ -41,6 +40,25 @@ class Entry:
 
         return res
 
+    def entries(self):
+        return [self]
+
+    def operands(self):
+        return []
+
+    def cost(self):
+        return 1
+
+    def key(self):
+        return ("entry", self.query, self.not_)
+
+    def match(self, mask):
+        # evaluate from the bitmask of the entries found by a Matcher
+        res = mask & self.bit != 0
+        if self.not_:
+            return not res
+        return res
+
     def __repr__(self):
         if self.not_:
             return f'NOT "{self.query}"'
@@ -64,55 +82,46 @@ class IndexEntry:
             self.search = self.search_simple
 
     def search_simple(self, index):
-        res = index.get(self.query_term)
-        return {match.id for match in res}
+        return index.get_ids(self.query_term)
 
     def search_multiword(self, index):
-        docs = defaultdict(list)
-        for token in self.query_term:
-            items = index.get(token)
-            for item in items:
-                docs[item.id].append((item.position, token))
-
-        # utils variable
-        first_token = self.query_term[0]
-        query_len = len(self.query_term)
-        query_rest = self.query_term[1:]
-        iter_rest = range(1, query_len)
-
-        results = set()
-        for doc_id, tokens in docs.items():
-            tokens = sorted(tokens)
-            if len(tokens) < query_len:
-                continue
-            for i in range(len(tokens) - query_len + 1):
-                pos, tok = tokens[i]
-                if tok != first_token:
-                    continue
-                is_a_match = True
-                for j, correct_token in zip(iter_rest, query_rest):
-                    next_pos, next_tok = tokens[i + j]
-                    if correct_token != next_tok or next_pos != pos + j:
-                        is_a_match = False
-                        break
-                if is_a_match:
-                    results.add(doc_id)
-                    break
-        return results
+        posting_lists = [index.get(token) for token in self.query_term]
+        return phrase_ids(posting_lists)
+
+    def occurrences(self, index):
+        # posting list of the positions where the term starts, and the
+        # number of positions it spans
+        if isinstance(self.query_term, list):
+            posting_lists = [index.get(token) for token in self.query_term]
+            return phrase_starts(posting_lists), len(self.query_term)
+        return index.get(self.query_term), 1
+
+    def operands(self):
+        return []
+
+    def key(self):
+        # normalized form, to cache results
+        if isinstance(self.query_term, list):
+            return ("phrase", tuple(self.query_term))
+        if "*" in self.query_term:
+            return ("wildcard", self.query_term)
+        return ("term", self.query_term)
+
+    def estimate(self, index):
+        if isinstance(self.query_term, list):
+            return min(index.estimate(token) for token in self.query_term)
+        return index.estimate(self.query_term)
 
     def __repr__(self):
+        query_term = self.query_term
+        if isinstance(query_term, list):
+            query_term = " ".join(query_term)
         if self.not_:
-            return f'NOT "{self.query_term}"'
-        return f'"{self.query_term}"'
+            return f'NOT "{query_term}"'
+        return f'"{query_term}"'
 
 
 def strip_quotes(query):
     if query[0] == '"' and query[-1] == '"':
         return query[1:-1]
     return query
-
-
-@dataclass(unsafe_hash=True, order=True)
-class Item:
-    id: int
-    position: int
@@ -1,7 +1,17 @@
-
-from PyQt6.QtWidgets import (QApplication, QHBoxLayout, QLabel, QLineEdit,
-                             QPushButton, QTableWidget, QTableWidgetItem,
-                             QVBoxLayout, QWidget)
+import numpy as np
+from PyQt6.QtCore import (QAbstractTableModel, QModelIndex, QObject,
+                          QRunnable, Qt, QThreadPool, QTimer, pyqtSignal)
+from PyQt6.QtWidgets import (QApplication, QHBoxLayout, QHeaderView, QLabel,
+                             QLineEdit, QPushButton, QTableView, QVBoxLayout,
+                             QWidget)
+
+# delay in milliseconds after the last keystroke before searching
+DEBOUNCE_MS = 250
+# rows added to the view at a time while scrolling, and read together from
+# the documents
+FETCH_SIZE = 256
+# pages of FETCH_SIZE rows kept as text
+MAX_PAGES = 64
 
 
 class SearchWidget(QWidget):
@@ -21,56 +31,145 @@ class SearchWidget(QWidget):
         self.setLayout(self.hbox)
 
 
+class ResultsModel(QAbstractTableModel):
+    # matching documents, read from the index only for the rows the view
+    # shows: rows are made available FETCH_SIZE at a time as the view
+    # scrolls, and their cells are converted to text a page at a time
+    def __init__(self, index, columns=None):
+        super().__init__()
+        # not `index`, the name of a method of the model
+        self.search_index = index
+        self.documents = None
+        self.columns = list(columns) if columns is not None else None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.n_rows = 0
+        self.pages = {}
+
+    def set_ids(self, ids):
+        self.beginResetModel()
+        # read for each result set: adding documents, or loading those of
+        # a saved index, replaces them
+        self.documents = self.search_index.documents
+        self.ids = ids
+        self.n_rows = min(FETCH_SIZE, len(ids))
+        self.pages = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.n_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 1 if self.columns is None else len(self.columns)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.n_rows < len(self.ids)
+
+    def fetchMore(self, parent):
+        n_rows = min(FETCH_SIZE, len(self.ids) - self.n_rows)
+        self.beginInsertRows(QModelIndex(), self.n_rows,
+                             self.n_rows + n_rows - 1)
+        self.n_rows += n_rows
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.row(index.row())[index.column()]
+
+    def headerData(self, section, orientation,
+                   role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return None if self.columns is None else str(
+                self.columns[section])
+        # rows are labelled with their doc id
+        return str(self.ids[section])
+
+    def row(self, row):
+        page, i = divmod(row, FETCH_SIZE)
+        rows = self.pages.get(page)
+        if rows is None:
+            if len(self.pages) >= MAX_PAGES:
+                self.pages.clear()
+            rows = self.pages[page] = self.read(
+                self.ids[page * FETCH_SIZE:(page + 1) * FETCH_SIZE])
+        return rows[i]
+
+    def read(self, ids):
+        # cells of the given documents, as text
+        if self.columns is None:
+            return [[str(self.documents[i])] for i in ids.tolist()]
+        frame = self.documents.iloc[ids]
+        return frame[self.columns].astype(str).values.tolist()
+
+
 class Results(QWidget):
-    def __init__(self, _is_dataframe, _columns=[]):
+    def __init__(self, index, _is_dataframe, _columns=[]):
         super().__init__()
         self.hbox = QVBoxLayout()
 
+        self.model = ResultsModel(
+            index, _columns if _is_dataframe else None)
+        self.tableView = QTableView()
+        self.tableView.setModel(self.model)
+        # rows have the same height, so the view does not measure them
+        self.tableView.verticalHeader().setSectionResizeMode(
+            QHeaderView.ResizeMode.Fixed)
+        header = self.tableView.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        header.setStretchLastSection(True)
         if not _is_dataframe:
-            self.tableWidget = QTableWidget()
-            self.tableWidget.setColumnCount(1)
-            self.tableWidget.setRowCount(0)
-            header = self.tableWidget.horizontalHeader()
             header.hide()
-            header.setStretchLastSection(True)
-        else:
-            self.tableWidget = QTableWidget()
-            self.tableWidget.setColumnCount(len(_columns))
-            self.tableWidget.setHorizontalHeaderLabels(_columns)
-            self.tableWidget.setRowCount(0)
-            header = self.tableWidget.horizontalHeader()
-            # header.setStretchLastSection(True)
-            self.update = self.update_dataframe
-            self._columns = _columns
+        self._resized = not _is_dataframe
 
         self.counter = QLabel("0 result")
         self.hbox.addWidget(self.counter)
-        self.hbox.addWidget(self.tableWidget)
-
-        self.tableWidget.resizeColumnsToContents()
+        self.hbox.addWidget(self.tableView)
         self.setLayout(self.hbox)
 
-    def update(self, data):
-        count = len(data)
-        self.counter.setText(f"{count} results")
+    def update(self, ids):
+        self.counter.setText(f"{len(ids)} results")
+        self.model.set_ids(ids)
+        if not self._resized and len(ids):
+            # columns are fitted once, to the first rows
+            self.tableView.resizeColumnsToContents()
+            self._resized = True
 
-        self.tableWidget.setRowCount(count)
-        for i, val in enumerate(data):
-            self.tableWidget.setItem(
-                i, 0, QTableWidgetItem(val))
-        self.tableWidget.resizeColumnsToContents()
+    def show_status(self, text):
+        self.counter.setText(text)
 
-    def update_dataframe(self, data):
-        count = len(data)
-        self.counter.setText(f"{count} results")
 
-        self.tableWidget.setRowCount(count)
-        for i, (_, val) in enumerate(data.iterrows()):
-            for j, column in enumerate(self._columns):
-                value = str(val[column])
-                self.tableWidget.setItem(
-                    i, j, QTableWidgetItem(value))
-        self.tableWidget.resizeColumnsToContents()
+class SearchSignals(QObject):
+    # (generation, ids) of a finished search, and (generation, message) of
+    # a failed one
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class SearchTask(QRunnable):
+    # search run on the worker thread. Tasks of a query that was replaced
+    # before they started are skipped, and the results of those replaced
+    # while running are dropped by the window
+    def __init__(self, index, query, generation, current, signals):
+        super().__init__()
+        self.index = index
+        self.query = query
+        self.generation = generation
+        self.current = current
+        self.signals = signals
+
+    def run(self):
+        if self.generation != self.current():
+            return
+        try:
+            ids = self.index.search(self.query, return_ids=True)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+        else:
+            self.signals.finished.emit(self.generation, ids)
 
 
 class Window(QWidget):
@@ -82,16 +181,56 @@ class Window(QWidget):
         layout = QVBoxLayout()
 
         self.search_widget = SearchWidget(self.search)
-        self.results_widget = Results(index._is_dataframe, index._columns)
+        self.results_widget = Results(
+            index, index._is_dataframe, index._columns)
 
         layout.addWidget(self.search_widget)
         layout.addWidget(self.results_widget)
         self.setLayout(layout)
 
+        # a single worker runs the searches, so that a new query waits for
+        # at most one running search, and queued ones are replaced
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.generation = 0
+        self.signals = SearchSignals()
+        self.signals.finished.connect(self.show_results)
+        self.signals.failed.connect(self.show_error)
+
+        # search as you type, once typing pauses
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self.search)
+        self.search_widget.search_input.textChanged.connect(self.timer.start)
+
     def search(self):
-        query = self.search_widget.search_input.text()
-        data = self.index.search(query)
-        self.results_widget.update(data)
+        self.timer.stop()
+        query = self.search_widget.search_input.text().strip()
+        # earlier queries are stale: drop those not started yet
+        self.generation += 1
+        self.pool.clear()
+        if not query:
+            self.results_widget.update(np.empty(0, dtype=np.int64))
+            return
+        self.results_widget.show_status("Searching...")
+        self.pool.start(SearchTask(
+            self.index, query, self.generation, lambda: self.generation,
+            self.signals))
+
+    def show_results(self, generation, ids):
+        if generation == self.generation:
+            self.results_widget.update(ids)
+
+    def show_error(self, generation, message):
+        if generation == self.generation:
+            self.results_widget.show_status(message)
+
+    def closeEvent(self, event):
+        self.generation += 1
+        self.pool.clear()
+        self.pool.waitForDone()
+        super().closeEvent(event)
 
 
 def create_app(index):
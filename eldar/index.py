@@ -1,13 +1,25 @@
 import re
-from collections import defaultdict
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
 
-from unidecode import unidecode
+import numpy as np
 
-from .entry import IndexEntry, Item
-from .query import is_balanced, strip_brackets
-from .regex import WORD_REGEX
+from . import setops
+from .analyzer import Analyzer
+from .bitmap import Bitmap
+from .cache import CACHE_SIZE, ResultCache
+from .entry import IndexEntry
+from .parallel import get_n_jobs, map_chunks, split
+from .postings import DOC_DTYPE, PostingList, Postings
+from .parser import QUERY_CACHE_SIZE, parse
+from .segment import Segment
 
-PUNCTUATION = """'!#$%&\'()+,-./:;<=>?@[\\]^_`{|}~'"""
+# number of segments above which recently added ones are merged
+MAX_SEGMENTS = 8
+# number of wildcard expansions kept in cache
+EXPANSION_CACHE_SIZE = 1024
 
 
 class Index:
@@ -16,184 +28,608 @@ class Index:
         ignore_case=True,
         ignore_accent=True,
         ignore_punctuation=True,
-        use_trie=True
+        use_trie=True,
+        use_bitmap=True,
+        analyzer=None,
+        cache_size=CACHE_SIZE,
+        compress=False
     ):
         self.ignore_case = ignore_case
         self.ignore_accent = ignore_accent
         self.ignore_punctuation = ignore_punctuation
+        if analyzer is None:
+            analyzer = Analyzer(
+                ignore_case, ignore_accent, ignore_punctuation)
+        self.analyzer = analyzer
         self.use_trie = use_trie
-        self._index = defaultdict(set)
+        self.use_bitmap = use_bitmap
+        # postings stored as compressed blocks, see compression.py
+        self.compress = compress
+        self._n_docs = 0
+        self._kgrams = None
+        self._expansions = {}
+        # results of query sub-trees, in bytes (0 disables it)
+        self.cache_size = cache_size
+        self._cache = ResultCache(cache_size) if cache_size else None
+        self._doc_lengths = None
+        self._facets = {}
+        # profile of the queries of each thread, see `profile`
+        self._local = threading.local()
+        self.documents = []
+        self._segments = []
         self._is_dataframe = False
         self._columns = []
+        self._column = None
 
-    def get(self, query_term):
+    def expand(self, query_term):
+        # indexed terms matching a (possibly wildcard) query term
         if query_term == "*":
             raise ValueError(
                 "Single character wildcards * are not implemented")
 
-        if self.ignore_punctuation:
-            query_term = query_term.translate(
-                str.maketrans('', '', PUNCTUATION))
+        query_term = self.analyzer.strip_punctuation(query_term)
 
         if "*" not in query_term:
-            res = self._index.get(query_term, set())
-            if not isinstance(res, set):
-                res = set(res)
-            return res
-        else:
-            query_regex = query_term.replace("*", ".*")
-            if self.use_trie:
-                matches = self._trie.get(query_term)
-                matches = [
-                    token for token in matches
-                    if re.match(query_regex, token) is not None
-                ]
+            return [query_term]
+
+        tokens = self._expansions.get(query_term)
+        if tokens is None:
+            if (self.use_trie and query_term.endswith("*") and
+                    query_term.count("*") == 1):
+                # prefix patterns are a range of the sorted vocabulary
+                tokens = self.expand_prefix(query_term)
             else:
-                matches = [
-                    token for token in self._index
-                    if re.match(query_regex, token) is not None
+                query_regex = re.compile(query_term.replace("*", ".*"))
+                # candidates sharing the substrings of the pattern, or else
+                # its prefix
+                matches = self.kgrams.get(query_term)
+                if matches is None:
+                    if self.use_trie:
+                        matches = self.expand_prefix(query_term)
+                    else:
+                        matches = self.vocabulary()
+                tokens = [
+                    token for token in matches
+                    if query_regex.match(token) is not None
                 ]
-            results = set()
-            for match in matches:
-                res = self._index[match]
-                if not isinstance(res, set):
-                    res = set(res)
-                results.update(res)
-            return results
-
-    def build(self, documents, column=None, verbose=False):
+            if len(self._expansions) >= EXPANSION_CACHE_SIZE:
+                self._expansions.clear()
+            self._expansions[query_term] = tokens
+        if self._profile is not None:
+            self._profile.expand(query_term, tokens)
+        return tokens
+
+    def expand_prefix(self, pattern):
+        # terms starting with the literal prefix of a pattern, found in the
+        # sorted term dictionary of each segment
+        if len(self._segments) == 1:
+            return self._segments[0].term_dictionary.expand(pattern)
+        return list(set().union(*(
+            segment.term_dictionary.expand(pattern)
+            for segment in self._segments)))
+
+    def vocabulary(self):
+        if len(self._segments) == 1:
+            return self._segments[0].terms.keys()
+        return set().union(*(
+            segment.terms.keys() for segment in self._segments))
+
+    def get(self, query_term):
+        tokens = self.expand(query_term)
+        return PostingList.union(
+            [segment.get(tokens) for segment in self._segments])
+
+    def get_ids(self, query_term, within=None):
+        # ids of the documents matching a query term, or of the sorted ids
+        # `within` that match it, found without reading its whole postings
+        tokens = self.expand(query_term)
+        if within is not None:
+            return setops.union([
+                segment.get_ids_within(tokens, within)
+                for segment in self._segments])
+        return setops.union([
+            segment.get_ids(tokens, self.bitmap_size)
+            for segment in self._segments], self.bitmap_size)
+
+    def estimate(self, query_term):
+        # upper bound of the number of documents matching a query term
+        tokens = self.expand(query_term)
+        return sum(
+            segment.document_frequency(tokens)
+            for segment in self._segments)
+
+    def build(self, documents, column=None, verbose=False, n_jobs=1):
         if isinstance(documents, list):
             self.documents = documents
-            if verbose:
-                from tqdm import tqdm
-                iteration = tqdm(enumerate(documents), total=len(documents))
-            else:
-                iteration = enumerate(documents)
-
+            texts = documents
         else:
             import pandas as pd
             assert isinstance(documents, pd.DataFrame)
             assert column is not None
-            assert list(documents.index) == list(range(len(documents)))
 
+            # doc ids are row positions, to be used with `iloc`
             self.documents = documents
             self._columns = documents.columns
+            self._column = column
             self._is_dataframe = True
+            texts = documents[column].tolist()
 
-            if verbose:
-                from tqdm import tqdm
-                iteration = tqdm(enumerate(documents[column]),
-                                 total=len(documents))
-            else:
-                iteration = enumerate(documents[column])
-
-        for i, document in iteration:
-            tokens = self.preprocess(document)
-            for j, token in enumerate(tokens):
-                if self.ignore_punctuation:
-                    token = token.translate(
-                        str.maketrans('', '', PUNCTUATION))
-                self._index[token].add(Item(i, j))
+        terms, term_stream, doc_lengths = self.tokenize_all(
+            texts, verbose, n_jobs)
+        self._segments = [self._compressed(
+            Segment.from_stream(terms, term_stream, doc_lengths))]
+        self._n_docs = len(doc_lengths)
 
+        self._kgrams = None
+        self._expansions = {}
+        self.clear_cache()
         if self.use_trie:
-            from .trie import Trie
-            self._trie = Trie()
-            self._trie.add_tokens(self._index.keys())
+            # built now rather than on the first prefix query
+            self._segments[0].term_dictionary
+        self.build_kgrams()
+
+    def tokenize_all(self, texts, verbose=False, n_jobs=1):
+        n_jobs = get_n_jobs(n_jobs)
+        if n_jobs > 1 and len(texts) > 1:
+            # shards of consecutive documents are tokenized in parallel, so
+            # the doc ids of a shard are offset by the size of the previous
+            # ones: merging the shards concatenates their token streams
+            shards = map_chunks(
+                _tokenize_shard,
+                [(self.config(), chunk) for chunk in split(texts, n_jobs)],
+                n_jobs, verbose=verbose)
+            terms = {}
+            term_stream = array("i")
+            doc_lengths = array("i")
+            for shard_terms, shard_stream, shard_lengths in shards:
+                mapping = np.array([
+                    terms.setdefault(token, len(terms))
+                    for token in shard_terms], dtype=np.int32)
+                shard_stream = np.frombuffer(shard_stream, dtype=np.int32)
+                term_stream.frombytes(mapping[shard_stream].tobytes())
+                doc_lengths.extend(shard_lengths)
+            return terms, term_stream, doc_lengths
+
+        if verbose:
+            from tqdm import tqdm
+            texts = tqdm(texts, total=len(texts))
+        return self.tokenize(texts)
+
+    def add(self, documents, verbose=False, n_jobs=1):
+        # index new documents without rebuilding, and return their ids
+        texts = self._texts(documents)
+        doc_ids = np.arange(
+            self._n_docs, self._n_docs + len(texts), dtype=DOC_DTYPE)
+        if self._is_dataframe:
+            import pandas as pd
+            self.documents = pd.concat([self.documents, documents])
+        else:
+            # lists and the document store of a loaded index are appended to
+            if not hasattr(self.documents, "extend"):
+                self.documents = list(self.documents)
+            self.documents.extend(texts)
+        self._n_docs += len(texts)
+        self._add_segment(texts, doc_ids, verbose, n_jobs)
+        return doc_ids
+
+    def delete(self, doc_ids):
+        # deleted documents are only marked as such, and are dropped from
+        # the postings by `compact`
+        doc_ids = self._check_ids(doc_ids)
+        for segment in self._segments:
+            segment.delete(doc_ids)
+        self.clear_cache()
+
+    def update(self, doc_ids, documents, verbose=False, n_jobs=1):
+        # replace documents, keeping their ids
+        doc_ids = self._check_ids(doc_ids)
+        texts = self._texts(documents)
+        if len(texts) != len(doc_ids):
+            raise ValueError("doc_ids and documents have different lengths")
+        if len(np.unique(doc_ids)) != len(doc_ids):
+            raise ValueError("doc_ids contains duplicates")
+        self.delete(doc_ids)
+        if self._is_dataframe:
+            columns = [
+                self.documents.columns.get_loc(column)
+                for column in documents.columns]
+            self.documents.iloc[doc_ids, columns] = documents.to_numpy()
+        else:
+            if not hasattr(self.documents, "__setitem__"):
+                self.documents = list(self.documents)
+            for doc_id, text in zip(doc_ids.tolist(), texts):
+                self.documents[doc_id] = text
+        order = np.argsort(doc_ids)
+        self._add_segment(
+            [texts[i] for i in order], doc_ids[order], verbose, n_jobs)
+
+    def compact(self):
+        # merge all segments into one, and drop deleted documents
+        if len(self._segments) == 0:
+            self._segments = [self._compressed(
+                Segment({}, Postings.empty(), self._n_docs))]
+        elif (len(self._segments) > 1 or
+              self._segments[0].deleted is not None):
+            self._segments = [self._compressed(
+                Segment.merge(self._segments, self._n_docs))]
+            self._kgrams = None
+            self._expansions = {}
+            self.clear_cache()
+
+    def _add_segment(self, texts, doc_ids, verbose=False, n_jobs=1):
+        terms, term_stream, doc_lengths = self.tokenize_all(
+            texts, verbose, n_jobs)
+        segment = self._compressed(Segment.from_stream(
+            terms, term_stream, doc_lengths, doc_ids))
+        self._segments.append(segment)
+        if self._kgrams is not None:
+            self._kgrams.add_tokens(segment.terms.keys())
+        self._expansions = {}
+        self.clear_cache()
+
+        # recent segments are merged together so that queries do not have
+        # to go through too many of them
+        if len(self._segments) > MAX_SEGMENTS:
+            self._segments = self._segments[:1] + [
+                self._compressed(Segment.merge(self._segments[1:]))]
+
+    def _compressed(self, segment):
+        if self.compress:
+            segment.compress()
+        return segment
+
+    def _texts(self, documents):
+        if self._is_dataframe:
+            return documents[self._column].tolist()
+        return list(documents)
+
+    def _check_ids(self, doc_ids):
+        doc_ids = np.atleast_1d(np.asarray(doc_ids, dtype=np.int64))
+        if len(doc_ids) and (doc_ids.min() < 0 or
+                             doc_ids.max() >= self._n_docs):
+            raise IndexError("document id out of range")
+        return doc_ids
+
+    @property
+    def kgrams(self):
+        if self._kgrams is None:
+            self.build_kgrams()
+        return self._kgrams
+
+    def build_kgrams(self):
+        from .kgram import KGramIndex
+
+        kgrams = KGramIndex()
+        kgrams.add_tokens(sorted(self.vocabulary()))
+        self._kgrams = kgrams
+
+    @property
+    def documents(self):
+        # documents saved in a pickle are only loaded when first needed
+        if callable(self._documents):
+            self._documents = self._documents()
+        return self._documents
+
+    @documents.setter
+    def documents(self, documents):
+        self._documents = documents
+
+    def tokenize(self, documents):
+        # the term id of every token is streamed into a flat array, and
+        # posting lists are built from it in one pass at the end
+        terms = {}
+        term_stream = array("i")
+        doc_lengths = array("i")
+        analyze = getattr(self.analyzer, "analyze", None)
+        if analyze is None:
+            # custom analyzers only have to normalize and tokenize
+            analyzer = self.analyzer
+
+            def analyze(document):
+                return [
+                    analyzer.strip_punctuation(token)
+                    for token in analyzer.tokenize(
+                        analyzer.normalize(document))]
+        for document in documents:
+            tokens = analyze(document)
+            term_stream.extend([
+                terms.setdefault(token, len(terms)) for token in tokens])
+            doc_lengths.append(len(tokens))
+        return terms, term_stream, doc_lengths
+
+    def config(self):
+        # empty index with the same settings, cheap to send to workers
+        return Index(
+            ignore_case=self.ignore_case,
+            ignore_accent=self.ignore_accent,
+            ignore_punctuation=self.ignore_punctuation,
+            use_trie=self.use_trie,
+            use_bitmap=self.use_bitmap,
+            analyzer=self.analyzer,
+            compress=self.compress)
 
     def preprocess(self, doc):
-        if self.ignore_case:
-            doc = doc.lower()
-        if self.ignore_accent:
-            doc = unidecode(doc)
-        doc = re.findall(WORD_REGEX, doc, re.UNICODE)
-        return doc
-
-    def search(self, query, return_ids=False):
-        query = parse_query(query,
-                            ignore_case=self.ignore_case,
-                            ignore_accent=self.ignore_accent)
-        ids = query.search(self)
+        return self.analyzer.tokenize(self.analyzer.normalize(doc))
+
+    def plan(self, query):
+        # parsed query, normalized and with the operands of AND nodes
+        # ordered from the rarest one
+        from . import indexops
+        from .planner import plan
+
+        # queries can also be given already parsed, by a ShardedIndex
+        if isinstance(query, str):
+            query = parse_query(query,
+                                ignore_case=self.ignore_case,
+                                ignore_accent=self.ignore_accent,
+                                analyzer=self.analyzer)
+        # unions do not depend on the order of their operands
+        return plan(query, indexops, lambda node: node.estimate(self),
+                    order_or=False)
+
+    def explain(self, query):
+        # print the plan of a query, with the estimated number of matching
+        # documents of each node (upper bounds)
+        from .planner import explain
+        print("\n".join(explain(
+            self.plan(query), lambda node: node.estimate(self))))
+
+    def search(
+        self,
+        query,
+        return_ids=False,
+        rank=False,
+        limit=None,
+        offset=0,
+        return_scores=False
+    ):
+        # matching documents by increasing id or, with `rank`, by decreasing
+        # BM25 score. `limit` and `offset` select a page of them, and
+        # `return_scores` also returns their scores (and implies `rank`)
+        query = self.plan(query)
+        ids = setops.to_ids(self.evaluate(query))
+        end = None if limit is None else offset + limit
+        if rank or return_scores:
+            from .ranking import top_k
+            ids, scores = top_k(self, query, ids, end)
+            scores = scores[offset:end]
+        ids = ids[offset:end]
+
         if return_ids:
-            return ids
-        if not self._is_dataframe:
-            return [self.documents[i] for i in ids]
-        return self.documents.iloc[list(ids)]
+            # ids may be those of the postings or of the cache: they are
+            # returned read-only, so that callers cannot change the index
+            results = ids.view()
+            results.setflags(write=False)
+        elif not self._is_dataframe:
+            results = [self.documents[i] for i in ids]
+        else:
+            results = self.documents.iloc[ids]
+        if return_scores:
+            return results, scores
+        return results
+
+    def evaluate(self, node):
+        if self._profile is not None:
+            return self._profile.evaluate(node, self._evaluate)
+        return self._evaluate(node)
+
+    def _evaluate(self, node):
+        # result of a query sub-tree, cached unless it is a single term,
+        # whose posting list is already at hand
+        key = node.key()
+        if self._cache is None or key[0] == "term":
+            return node.search(self)
+        result = self._cache.get(key)
+        if result is None:
+            result = node.search(self)
+            self._cache.put(key, result)
+        elif self._profile is not None:
+            self._profile.cache_hit()
+        return result
+
+    @contextmanager
+    def profile(self, hooks=()):
+        # measure the queries run in the block, node by node:
+        #     with index.profile() as profile:
+        #         index.search(query)
+        #     print(profile)
+        # Only the queries of the thread that opened the block are measured.
+        # Global statistics are added to the profile at the end of the
+        # block, and it is passed to `hooks` and to `profiling.hooks`
+        from .profiling import Profile
+
+        profile = Profile(hooks)
+        self._local.profile = profile
+        try:
+            yield profile
+        finally:
+            self._local.profile = None
+        profile.finish(self.stats())
+
+    @property
+    def _profile(self):
+        return getattr(self._local, "profile", None)
+
+    def stats(self):
+        # global statistics of the index, for monitoring. Posting lengths
+        # are those of each term in each segment
+        from .profiling import distribution
+
+        segments = self._segments
+        lengths = [
+            np.diff(segment.postings.doc_offsets) for segment in segments]
+        cache = self.cache_info()
+        if cache is not None and cache["hits"] + cache["misses"]:
+            cache["hit_rate"] = (
+                cache["hits"] / (cache["hits"] + cache["misses"]))
+        return {
+            "n_docs": self._n_docs,
+            "n_live_docs": self.n_live_docs,
+            "n_segments": len(segments),
+            "vocabulary_size": (
+                len(segments[0].terms) if len(segments) == 1
+                else len(self.vocabulary())),
+            "posting_lengths": distribution(
+                np.concatenate(lengths) if lengths else []),
+            "term_dictionary_bytes": sum(
+                segment._term_dictionary.nbytes for segment in segments
+                if segment._term_dictionary is not None),
+            "kgrams": (
+                len(self._kgrams.grams) if self._kgrams is not None
+                else None),
+            "expansion_cache": len(self._expansions),
+            "cache": cache,
+            "parse_cache": parse_query.cache_info()._asdict()
+        }
+
+    def clear_cache(self):
+        # called whenever the indexed documents change
+        self._doc_lengths = None
+        self._facets = {}
+        if self._cache is not None:
+            self._cache.clear()
+
+    def cache_info(self):
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    @property
+    def doc_lengths(self):
+        # number of tokens of each document by id, 0 for deleted ones
+        if self._doc_lengths is None:
+            segments = self._segments
+            if (len(segments) == 1 and segments[0].doc_ids is None and
+                    segments[0].deleted is None):
+                self._doc_lengths = segments[0].doc_lengths
+            else:
+                lengths = np.zeros(self._n_docs, dtype=np.int32)
+                for segment in segments:
+                    live = np.arange(segment.n_docs)
+                    if segment.deleted is not None:
+                        live = live[~segment.deleted]
+                    lengths[segment.global_ids(live)] = (
+                        segment.doc_lengths[live])
+                self._doc_lengths = lengths
+        return self._doc_lengths
+
+    @property
+    def n_live_docs(self):
+        return sum(len(segment.live_ids()) for segment in self._segments)
+
+    @property
+    def bitmap_size(self):
+        # size of the doc-id universe when dense results may be bitmaps
+        if self.use_bitmap:
+            return self._n_docs
+        return None
 
     def count(self, query):
-        return len(self.search(query, return_ids=True))
+        # number of matches, counted on the result bitmap or array without
+        # listing ids, and without building the last intersection of an AND
+        from .indexops import AND
+
+        query = self.plan(query)
+        if isinstance(query, AND) and self._profile is None and (
+                self._cache is None or query.key() not in self._cache):
+            return query.count(self)
+        return len(self.evaluate(query))
+
+    def facet(self, query, by, freq=None):
+        # number of matching documents for each value of `by`, a column of
+        # the indexed DataFrame or an array with a value per document. Dates
+        # are grouped by period with `freq` (e.g. "D" for days)
+        import pandas as pd
+
+        codes, values = self._facet_codes(by, freq)
+        result = self.evaluate(self.plan(query))
+        if isinstance(result, Bitmap):
+            codes = codes[result.to_mask()]
+        else:
+            codes = codes[result]
+        counts = np.bincount(codes[codes >= 0], minlength=len(values))
+        counts = pd.Series(counts, index=values, name="count")
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    def _facet_codes(self, by, freq=None):
+        # values of `by` as integer codes, factorized once per column
+        import pandas as pd
+
+        key = (by, freq) if isinstance(by, str) else None
+        if key in self._facets:
+            return self._facets[key]
+        if isinstance(by, str):
+            if not self._is_dataframe:
+                raise ValueError(
+                    "Faceting by column needs an index of a DataFrame")
+            values = self.documents[by]
+        else:
+            values = pd.Series(by)
+            if len(values) != self._n_docs:
+                raise ValueError("by must have a value for each document")
+        if freq is not None:
+            values = pd.to_datetime(values).dt.floor(freq)
+        codes, uniques = pd.factorize(values, sort=True)
+        if key is not None:
+            self._facets[key] = codes, uniques
+        return codes, uniques
+
+    def memory_usage(self):
+        # approximate size in bytes of the index structures, documents
+        # excluded
+        import sys
+        usage = {"postings": 0, "terms": 0}
+        for segment in self._segments:
+            usage["postings"] += segment.nbytes
+            if isinstance(segment.terms, dict):
+                usage["terms"] += sys.getsizeof(segment.terms) + sum(
+                    sys.getsizeof(term) for term in segment.terms)
+            else:
+                usage["terms"] += segment.terms.nbytes
+            dictionary = segment._term_dictionary
+            if dictionary is not None and dictionary is not segment.terms:
+                usage["term_dictionary"] = usage.get(
+                    "term_dictionary", 0) + dictionary.nbytes
+        if self._kgrams is not None:
+            usage["kgrams"] = self._kgrams.memory_usage()
+        usage["total"] = sum(usage.values())
+        return usage
 
     def save(self, filename):
-        import pickle
-        with open(filename, "wb") as f:
-            pickle.dump(self, f)
+        from .storage import save_index
+        save_index(self, filename)
 
     @staticmethod
     def load(filename):
-        import pickle
-        with open(filename, "rb") as f:
-            index = pickle.load(f)
-        return index
+        from .storage import load_index
+        return load_index(filename, Index.__new__(Index))
+
+    def __getstate__(self):
+        # profiles are not sent to worker processes
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
 
     def gui(self):
         from .gui import create_app
         create_app(self)
 
 
-def parse_query(query, ignore_case=True, ignore_accent=True):
-    from .indexops import AND, ANDNOT, OR
-
-    # remove brackets around query
-    if query[0] == '(' and query[-1] == ')':
-        query = strip_brackets(query)
-    # if there are quotes around query, make an entry
-    if query[0] == '"' and query[-1] == '"' and query.count('"') == 1:
-        if ignore_case:
-            query = query.lower()
-        if ignore_accent:
-            query = unidecode(query)
-        return IndexEntry(query)
-
-    # find all operators
-    match = []
-    match_iter = re.finditer(r" (AND NOT|AND|OR) ", query, re.IGNORECASE)
-    for m in match_iter:
-        start = m.start(0)
-        end = m.end(0)
-        operator = query[start+1:end-1].lower()
-        match_item = (start, end)
-        match.append((operator, match_item))
-    match_len = len(match)
-
-    if match_len != 0:
-        # stop at first balanced operation
-        for i, (operator, (start, end)) in enumerate(match):
-            left_part = query[:start]
-            if not is_balanced(left_part):
-                continue
-
-            right_part = query[end:]
-            if not is_balanced(right_part):
-                raise ValueError("Query malformed")
-            break
-
-        if operator == "or":
-            return OR(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-        elif operator == "and":
-            return AND(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-        elif operator == "and not":
-            return ANDNOT(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-    else:
-        if ignore_case:
-            query = query.lower()
-        if ignore_accent:
-            query = unidecode(query)
-        return IndexEntry(query)
+def _tokenize_shard(args):
+    index, documents = args
+    terms, term_stream, doc_lengths = index.tokenize(documents)
+    return list(terms), term_stream, doc_lengths
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def parse_query(query, ignore_case=True, ignore_accent=True, analyzer=None):
+    from . import indexops
+
+    if analyzer is None:
+        analyzer = Analyzer(ignore_case, ignore_accent)
+    return parse(
+        query, indexops, lambda term: IndexEntry(analyzer.normalize(term)))
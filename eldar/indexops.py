@@ -1,3 +1,8 @@
+import numpy as np
+
+from .postings import followed_ids
+from .setops import (
+    SKIP_RATIO, count_intersection, difference, intersect, union)
 
 
 class Binary:
@@ -5,32 +10,158 @@ class Binary:
         self.left = left
         self.right = right
 
+    def operands(self):
+        return [self.left, self.right]
+
+
+class Nary:
+    # associative operators: chains produced by `parse_query`, such as
+    # OR(a, OR(b, c)), are flattened into a single node OR(a, b, c)
+    def __init__(self, *children):
+        self.children = []
+        for child in children:
+            if type(child) is type(self):
+                self.children.extend(child.children)
+            else:
+                self.children.append(child)
+
+    def operands(self):
+        return self.children
+
+
+class AND(Nary):
+    operator = "AND"
 
-class AND(Binary):
     def search(self, index):
-        left_match = self.left.search(index)
-        right_match = self.right.search(index)
-        return left_match.intersection(right_match)
+        # operands are ordered by the planner from the rarest one, so every
+        # intersection probes the common operands with a short list, and
+        # stops as soon as it is empty
+        return self.intersect(index, self.children)
+
+    def count(self, index):
+        # the last intersection is only counted
+        result = self.intersect(index, self.children[:-1])
+        if len(result) == 0:
+            return 0
+        probed = probe(index, self.children[-1], result)
+        if probed is not None:
+            return len(probed)
+        return count_intersection(
+            result, index.evaluate(self.children[-1]))
+
+    @staticmethod
+    def intersect(index, children):
+        result = index.evaluate(children[0])
+        for child in children[1:]:
+            if len(result) == 0:
+                break
+            probed = probe(index, child, result)
+            if probed is not None:
+                result = probed
+            else:
+                result = intersect(
+                    result, index.evaluate(child), index.bitmap_size)
+        return result
+
+    def key(self):
+        # operands are commutative and idempotent
+        return ("and", tuple(sorted(
+            {child.key() for child in self.children})))
+
+    def estimate(self, index):
+        return min(child.estimate(index) for child in self.children)
 
     def __repr__(self):
-        return f"({self.left}) AND ({self.right})"
+        return " AND ".join(f"({child})" for child in self.children)
 
 
 class ANDNOT(Binary):
+    operator = "AND NOT"
+
     def search(self, index):
-        left_match = self.left.search(index)
-        right_match = self.right.search(index)
-        return left_match.difference(right_match)
+        left_match = index.evaluate(self.left)
+        if len(left_match) == 0:
+            return left_match
+        right_match = index.evaluate(self.right)
+        return difference(left_match, right_match, index.bitmap_size)
+
+    def key(self):
+        return ("andnot", self.left.key(), self.right.key())
+
+    def estimate(self, index):
+        return self.left.estimate(index)
 
     def __repr__(self):
         return f"({self.left}) AND NOT ({self.right})"
 
 
-class OR(Binary):
+class OR(Nary):
+    operator = "OR"
+
     def search(self, index):
-        left_match = self.left.search(index)
-        right_match = self.right.search(index)
-        return left_match.union(right_match)
+        return union(
+            [index.evaluate(child) for child in self.children],
+            index.bitmap_size)
+
+    def key(self):
+        return ("or", tuple(sorted(
+            {child.key() for child in self.children})))
+
+    def estimate(self, index):
+        return sum(child.estimate(index) for child in self.children)
+
+    def __repr__(self):
+        return " OR ".join(f"({child})" for child in self.children)
+
+
+class NEAR(Binary):
+    # terms or phrases at most k positions apart: in any order, or with
+    # `ordered`, the right one after the left one (W/k)
+    def __init__(self, left, right, k, ordered=False):
+        from .entry import IndexEntry
+
+        if not (isinstance(left, IndexEntry) and
+                isinstance(right, IndexEntry)):
+            raise ValueError(
+                "Operands of proximity operators must be terms or phrases")
+        super().__init__(left, right)
+        self.k = k
+        self.ordered = ordered
+
+    def search(self, index):
+        left, left_length = self.left.occurrences(index)
+        if len(left) == 0:
+            return left.ids
+        right, right_length = self.right.occurrences(index)
+        ids = followed_ids(left, right, self.k, left_length)
+        if self.ordered:
+            return ids
+        return np.union1d(
+            ids, followed_ids(right, left, self.k, right_length))
+
+    def key(self):
+        if self.ordered:
+            return ("w", self.k, self.left.key(), self.right.key())
+        return ("near", self.k) + tuple(
+            sorted([self.left.key(), self.right.key()]))
+
+    def estimate(self, index):
+        return min(self.left.estimate(index), self.right.estimate(index))
+
+    @property
+    def operator(self):
+        return f"{'W' if self.ordered else 'NEAR'}/{self.k}"
 
     def __repr__(self):
-        return f"({self.left}) OR ({self.right})"
+        return f"({self.left}) {self.operator} ({self.right})"
+
+
+def probe(index, child, result):
+    # ids of a short `result` that match a term of a much longer posting
+    # list, or None. With compressed postings, only the blocks that may hold
+    # them are decoded, instead of the whole list
+    if (index.compress and isinstance(result, np.ndarray) and
+            child.key()[0] in ("term", "wildcard") and
+            len(result) * SKIP_RATIO < child.estimate(index)):
+        return index.get_ids(child.query_term, within=result)
+    return None
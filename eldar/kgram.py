@@ -0,0 +1,82 @@
+import re
+from array import array
+
+import numpy as np
+
+# length of the substrings indexed for each term
+K = 3
+# marks the start of terms, so that grams can be anchored
+START = "\x02"
+
+
+class KGramIndex:
+    # maps every substring of length K of the terms to the ids of the terms
+    # containing it, to find the candidate terms of wildcard patterns
+    # without scanning the vocabulary
+    def __init__(self, k=K):
+        self.k = k
+        self.ids = {}
+        self.terms = []
+        self.grams = {}
+
+    def add_tokens(self, tokens):
+        ids = self.ids
+        terms = self.terms
+        grams = self.grams
+        k = self.k
+        for token in tokens:
+            if token in ids:
+                continue
+            term_id = len(terms)
+            ids[token] = term_id
+            terms.append(token)
+            padded = START + token
+            for gram in {padded[i:i + k] for i in range(len(padded) - k + 1)}:
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array("i")
+                # ids are appended in increasing order, so lists are sorted
+                posting.append(term_id)
+
+    def pattern_grams(self, pattern):
+        # grams that a term must contain to match the wildcard pattern at
+        # its start: those of its runs of literal word characters
+        if not pattern.startswith("*"):
+            pattern = START + pattern
+        pieces = re.split(r"[^\w" + START + "]+", pattern)
+        k = self.k
+        return {
+            piece[i:i + k]
+            for piece in pieces
+            for i in range(len(piece) - k + 1)}
+
+    def get(self, pattern):
+        # candidate terms for a wildcard pattern, a superset of its matches,
+        # or None when the pattern has no literal part long enough
+        grams = self.pattern_grams(pattern)
+        if len(grams) == 0:
+            return None
+        postings = []
+        for gram in grams:
+            posting = self.grams.get(gram)
+            if posting is None:
+                return []
+            postings.append(np.frombuffer(posting, dtype=np.int32))
+        postings.sort(key=len)
+        ids = postings[0]
+        for posting in postings[1:]:
+            ids = np.intersect1d(ids, posting, assume_unique=True)
+            if len(ids) == 0:
+                return []
+        terms = self.terms
+        return [terms[i] for i in ids.tolist()]
+
+    def memory_usage(self):
+        import sys
+        size = sys.getsizeof(self.ids) + sys.getsizeof(self.terms)
+        size += sum(sys.getsizeof(term) for term in self.terms)
+        size += sys.getsizeof(self.grams)
+        size += sum(
+            sys.getsizeof(gram) + sys.getsizeof(posting)
+            for gram, posting in self.grams.items())
+        return size
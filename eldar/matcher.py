@@ -0,0 +1,127 @@
+import re
+from collections import deque
+
+# below this number of substring terms, one `in` scan per term is faster
+# than walking the automaton in Python
+AUTOMATON_MIN_TERMS = 64
+
+
+class Automaton:
+    # Aho-Corasick automaton: finds all occurrences of a set of words in a
+    # single pass over the text, and returns the OR of their bits
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [0]
+        for word, bit in words.items():
+            self.add_word(word, bit)
+        self.link()
+
+    def add_word(self, word, bit):
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(0)
+                self.goto[state][char] = next_state
+            state = next_state
+        self.out[state] |= bit
+
+    def link(self):
+        # breadth-first computation of the failure links, which are folded
+        # into the transitions so that scanning never backtracks
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(char, 0)
+                self.fail[next_state] = fail
+                self.out[next_state] |= self.out[fail]
+            if state:
+                transitions = dict(self.goto[self.fail[state]])
+                transitions.update(self.goto[state])
+                self.goto[state] = transitions
+
+    def scan(self, text):
+        goto = self.goto
+        out = self.out
+        state = 0
+        mask = 0
+        for char in text:
+            state = goto[state].get(char, 0)
+            bits = out[state]
+            if bits:
+                mask |= bits
+        return mask
+
+
+class Matcher:
+    # matches all the leaf entries of a query at once, and returns a
+    # bitmask of the entries found in the document
+    def __init__(self, entries, match_word=True):
+        self.match_word = match_word
+        self.terms = {}
+        self.wildcards = []
+        bits = {}
+        for entry in entries:
+            if entry.rgx is not None:
+                key = (True, entry.pattern)
+            else:
+                key = (False, entry.query)
+            if key not in bits:
+                bits[key] = 1 << len(bits)
+                if entry.rgx is not None:
+                    self.wildcards.append((entry.rgx, bits[key]))
+                else:
+                    self.terms[entry.query] = bits[key]
+            entry.bit = bits[key]
+
+        # any token matching a wildcard matches this combined pattern,
+        # which spares testing every pattern on every token
+        if self.wildcards:
+            self.wildcard_rgx = re.compile("|".join(
+                f"(?:{rgx.pattern})" for rgx, _ in self.wildcards))
+
+        self.automaton = None
+        if not match_word and len(self.terms) >= AUTOMATON_MIN_TERMS:
+            self.automaton = Automaton(self.terms)
+
+    def scan(self, doc):
+        # `doc` is a set of tokens if match_word, else a string
+        terms = self.terms
+        mask = 0
+        if self.automaton is not None:
+            mask = self.automaton.scan(doc)
+            if "" in terms:
+                mask |= terms[""]
+        elif self.match_word and len(doc) < len(terms):
+            for token in doc:
+                mask |= terms.get(token, 0)
+        else:
+            for term, bit in terms.items():
+                if term in doc:
+                    mask |= bit
+
+        if self.wildcards:
+            mask |= self.scan_wildcards(doc)
+        return mask
+
+    def scan_wildcards(self, doc):
+        if isinstance(doc, str):
+            doc = [doc]
+        mask = 0
+        wildcard_rgx = self.wildcard_rgx
+        for item in doc:
+            if wildcard_rgx.match(item) is None:
+                continue
+            for rgx, bit in self.wildcards:
+                if not mask & bit and rgx.match(item):
+                    mask |= bit
+        return mask
@@ -1,26 +1,63 @@
-
-
 class Binary:
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
+    def entries(self):
+        return self.left.entries() + self.right.entries()
+
+    def operands(self):
+        return [self.left, self.right]
+
+
+class Nary:
+    # associative operators: chains produced by `parse_query`, such as
+    # OR(a, OR(b, c)), are flattened into a single node OR(a, b, c)
+    def __init__(self, *children):
+        self.children = []
+        for child in children:
+            if type(child) is type(self):
+                self.children.extend(child.children)
+            else:
+                self.children.append(child)
+
+    def entries(self):
+        return [
+            entry for child in self.children for entry in child.entries()]
+
+    def operands(self):
+        return self.children
+
+    def cost(self):
+        return sum(child.cost() for child in self.children)
+
+
+class AND(Nary):
+    operator = "AND"
 
-class AND(Binary):
     def evaluate(self, doc):
-        left_match = self.left.evaluate(doc)
-        if not left_match:
-            return False
-        right_match = self.right.evaluate(doc)
-        if not right_match:
-            return False
+        for child in self.children:
+            if not child.evaluate(doc):
+                return False
+        return True
+
+    def match(self, mask):
+        for child in self.children:
+            if not child.match(mask):
+                return False
         return True
 
+    def key(self):
+        return ("and", tuple(sorted(
+            {child.key() for child in self.children})))
+
     def __repr__(self):
-        return f"({self.left}) AND ({self.right})"
+        return " AND ".join(f"({child})" for child in self.children)
 
 
 class ANDNOT(Binary):
+    operator = "AND NOT"
+
     def evaluate(self, doc):
         left_match = self.left.evaluate(doc)
         if not left_match:
@@ -28,17 +65,37 @@ class ANDNOT(Binary):
         right_match = self.right.evaluate(doc)
         return not right_match
 
+    def match(self, mask):
+        return self.left.match(mask) and not self.right.match(mask)
+
+    def cost(self):
+        return self.left.cost() + self.right.cost()
+
+    def key(self):
+        return ("andnot", self.left.key(), self.right.key())
+
     def __repr__(self):
         return f"({self.left}) AND NOT ({self.right})"
 
 
-class OR(Binary):
+class OR(Nary):
+    operator = "OR"
+
     def evaluate(self, doc):
-        if self.left.evaluate(doc):
-            return True
-        if self.right.evaluate(doc):
-            return True
+        for child in self.children:
+            if child.evaluate(doc):
+                return True
         return False
 
+    def match(self, mask):
+        for child in self.children:
+            if child.match(mask):
+                return True
+        return False
+
+    def key(self):
+        return ("or", tuple(sorted(
+            {child.key() for child in self.children})))
+
     def __repr__(self):
-        return f"({self.left}) OR ({self.right})"
+        return " OR ".join(f"({child})" for child in self.children)
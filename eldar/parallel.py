@@ -0,0 +1,54 @@
+import os
+
+# each worker receives several chunks, to even out their durations
+CHUNKS_PER_JOB = 4
+
+
+def get_n_jobs(n_jobs):
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def split(documents, n_jobs, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = -(-len(documents) // (n_jobs * CHUNKS_PER_JOB))
+    chunk_size = max(1, chunk_size)
+    return [
+        documents[i:i + chunk_size]
+        for i in range(0, len(documents), chunk_size)]
+
+
+def map_chunks(func, args, n_jobs, verbose=False):
+    # apply `func` to each item of `args` in a process pool, and return the
+    # results in the order of `args`
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(n_jobs) as executor:
+        results = executor.map(func, args)
+        if verbose:
+            from tqdm import tqdm
+            results = tqdm(results, total=len(args))
+        return list(results)
+
+
+def imap_chunks(func, items, n_jobs, max_pending=None):
+    # lazy version of map_chunks that yields (item, func(item)) pairs in
+    # order, with a bounded number of items in flight
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    if max_pending is None:
+        max_pending = 2 * n_jobs
+    with ProcessPoolExecutor(n_jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= max_pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
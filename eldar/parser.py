@@ -0,0 +1,138 @@
+import re
+
+# number of parsed queries kept in cache
+QUERY_CACHE_SIZE = 1024
+
+# brackets, operators (followed by a space, a bracket or the end of the
+# query), quoted strings and words, after optional spaces
+TOKEN_PATTERN = (
+    r'\s*(?:(\()|(\))|({operators})(?=[\s()"]|$)'
+    r'|("[^"]*"|[^\s()"]+))')
+TOKEN_REGEX = re.compile(
+    TOKEN_PATTERN.format(operators=r"AND\s+NOT|AND|OR"), re.IGNORECASE)
+# with the proximity operators, for the modules that define NEAR
+PROXIMITY_TOKEN_REGEX = re.compile(
+    TOKEN_PATTERN.format(operators=r"AND\s+NOT|AND|OR|NEAR/\d+|W/\d+"),
+    re.IGNORECASE)
+PROXIMITY = ("near/", "w/")
+
+
+def tokenize(query, proximity=False):
+    # yield (kind, value, start, end) for each token of the query, in a
+    # single pass. Kinds are "(", ")", "operator" and "term". NEAR/k and
+    # W/k are only operators with `proximity`, and words otherwise
+    regex = PROXIMITY_TOKEN_REGEX if proximity else TOKEN_REGEX
+    pos = 0
+    while True:
+        match = regex.match(query, pos)
+        if match is None:
+            if query[pos:].strip():
+                raise ValueError("Query malformed")
+            return
+        pos = match.end()
+        open_, close, operator, term = match.groups()
+        if open_ is not None:
+            yield "(", open_, match.start(1), pos
+        elif close is not None:
+            yield ")", close, match.start(2), pos
+        elif operator is not None:
+            yield ("operator", " ".join(operator.lower().split()),
+                   match.start(3), pos)
+        else:
+            yield "term", term, match.start(4), pos
+
+
+def parse(query, ops, make_entry):
+    # build the tree of a query with the AND, ANDNOT, OR (and NEAR) classes
+    # of the `ops` module, and `make_entry` for its terms. Brackets are
+    # handled with an explicit stack, so deep nesting and long chains do not
+    # recurse. Consecutive words and quoted strings form a single term
+    stack = []
+    operands, operators = [], []
+    term = None  # (start, end) of the term being read
+    # (start, end) of a term and of the operator right after it, while that
+    # operator is the last token read
+    trailing = None
+    for kind, value, start, end in tokenize(
+            query, proximity=hasattr(ops, "NEAR")):
+        term_start = None
+        if term is not None:
+            if kind == "term":
+                term = (term[0], end)
+                continue
+            operands.append(make_entry(query[term[0]:term[1]]))
+            term_start = term[0]
+            term = None
+        trailing = None
+
+        need_operand = len(operands) == len(operators)
+        if kind == ")":
+            if need_operand or not stack:
+                raise ValueError("Query malformed")
+            node = fold(operands, operators, ops)
+            operands, operators = stack.pop()
+            operands.append(node)
+        elif kind == "operator" and not need_operand:
+            operators.append(value)
+            if term_start is not None:
+                trailing = (term_start, end)
+        elif not need_operand:
+            # a term or a bracket right after an operand
+            raise ValueError("Query malformed")
+        elif kind == "(":
+            stack.append((operands, operators))
+            operands, operators = [], []
+        else:
+            # operators where a term is expected are words
+            term = (start, end)
+
+    if term is not None:
+        operands.append(make_entry(query[term[0]:term[1]]))
+    elif trailing is not None and len(operands) == len(operators):
+        # like operators where a term is expected, an operator ending the
+        # query is a word, of the term before it
+        operators.pop()
+        operands[-1] = make_entry(query[trailing[0]:trailing[1]])
+    if stack or len(operands) == len(operators):
+        raise ValueError("Query malformed")
+    return fold(operands, operators, ops)
+
+
+def fold(operands, operators, ops):
+    # tree of `operands` joined by `operators`. Proximity operators bind
+    # tighter than boolean ones, and operators of the same level are
+    # right-associative: a AND b OR c is a AND (b OR c)
+    if any(operator.startswith(PROXIMITY) for operator in operators):
+        grouped_operands = [operands[-1]]
+        grouped_operators = []
+        for i in reversed(range(len(operators))):
+            operator = operators[i]
+            if operator.startswith(PROXIMITY):
+                name, k = operator.split("/")
+                grouped_operands[-1] = ops.NEAR(
+                    operands[i], grouped_operands[-1], int(k),
+                    ordered=name == "w")
+            else:
+                grouped_operators.append(operator)
+                grouped_operands.append(operands[i])
+        operands = grouped_operands[::-1]
+        operators = grouped_operators[::-1]
+
+    node = operands[-1]
+    i = len(operators) - 1
+    while i >= 0:
+        operator = operators[i]
+        if operator == "and not":
+            node = ops.ANDNOT(operands[i], node)
+            i -= 1
+            continue
+        # a run of the same associative operator makes a single node
+        children = [node]
+        while i >= 0 and operators[i] == operator:
+            children.append(operands[i])
+            i -= 1
+        if operator == "and":
+            node = ops.AND(*children[::-1])
+        else:
+            node = ops.OR(*children[::-1])
+    return node
@@ -0,0 +1,199 @@
+from .analyzer import Analyzer
+from .entry import Entry
+from .matcher import AUTOMATON_MIN_TERMS, Automaton
+from .operators import ANDNOT, OR
+from .query import Query
+
+
+class QuerySet:
+    # reverse search: many registered queries matched against each incoming
+    # document. Queries are indexed by their required terms, so a document
+    # is preprocessed once, and only the queries whose terms it holds are
+    # evaluated
+    def __init__(
+        self,
+        queries=(),
+        ignore_case=True,
+        ignore_accent=True,
+        match_word=True,
+        analyzer=None
+    ):
+        # settings of the queries added as strings
+        self.ignore_case = ignore_case
+        self.ignore_accent = ignore_accent
+        self.match_word = match_word
+        if analyzer is None:
+            analyzer = Analyzer(ignore_case, ignore_accent)
+        self.analyzer = analyzer
+        self.queries = {}
+        self._groups = {}
+        self._next_key = 0
+        if isinstance(queries, dict):
+            queries = queries.items()
+        else:
+            queries = ((None, query) for query in queries)
+        for key, query in queries:
+            self.add(query, key)
+
+    def add(self, query, key=None):
+        # register a query (a Query or a string), and return its key
+        if not isinstance(query, Query):
+            query = Query(
+                query, self.ignore_case, self.ignore_accent, self.match_word,
+                self.analyzer)
+        if key is None:
+            while self._next_key in self.queries:
+                self._next_key += 1
+            key = self._next_key
+        if key in self.queries:
+            self.remove(key)
+        group_key = (query.analyzer, query.match_word)
+        if group_key not in self._groups:
+            self._groups[group_key] = QueryGroup(
+                query.analyzer, query.match_word)
+        self._groups[group_key].add(key, query)
+        self.queries[key] = query
+        return key
+
+    def remove(self, key):
+        query = self.queries.pop(key)
+        group_key = (query.analyzer, query.match_word)
+        group = self._groups[group_key]
+        group.remove(key)
+        if not group.queries:
+            del self._groups[group_key]
+
+    def match(self, doc):
+        # keys of the queries matching the document, in order of addition
+        matches = set()
+        for group in self._groups.values():
+            matches.update(group.match(doc))
+        return [key for key in self.queries if key in matches]
+
+    def imatch(self, documents):
+        # yield the keys of the matching queries of each document
+        for doc in documents:
+            yield self.match(doc)
+
+    def __call__(self, doc):
+        return self.match(doc)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __contains__(self, key):
+        return key in self.queries
+
+    def __getitem__(self, key):
+        return self.queries[key]
+
+    def __repr__(self):
+        return f"QuerySet({len(self.queries)} queries)"
+
+
+class QueryGroup:
+    # queries sharing a normalization, indexed by required terms
+    def __init__(self, analyzer, match_word):
+        self.analyzer = analyzer
+        self.match_word = match_word
+        self.queries = {}
+        self.postings = {}  # required term -> keys of queries
+        self.always = set()  # keys of queries without required terms
+        self.terms = {}  # key -> required terms
+        self._automaton = None
+        self._bits = None
+
+    def add(self, key, query):
+        terms = required_terms(query.query)
+        # an empty term is in every text when matching substrings
+        if terms is not None and not self.match_word and "" in terms:
+            terms = None
+        self.queries[key] = query
+        self.terms[key] = terms
+        if terms is None:
+            self.always.add(key)
+        else:
+            for term in terms:
+                self.postings.setdefault(term, set()).add(key)
+        self._automaton = None
+
+    def remove(self, key):
+        del self.queries[key]
+        terms = self.terms.pop(key)
+        if terms is None:
+            self.always.discard(key)
+        else:
+            for term in terms:
+                keys = self.postings[term]
+                keys.discard(key)
+                if not keys:
+                    del self.postings[term]
+        self._automaton = None
+
+    def preprocess(self, doc):
+        doc = self.analyzer.normalize(doc)
+        if self.match_word:
+            doc = set(self.analyzer.tokenize(doc))
+        return doc
+
+    def candidates(self, doc):
+        # keys of the queries that may match the preprocessed document
+        candidates = set(self.always)
+        postings = self.postings
+        if self.match_word:
+            if len(doc) < len(postings):
+                found = [token for token in doc if token in postings]
+            else:
+                found = [term for term in postings if term in doc]
+        elif len(postings) < AUTOMATON_MIN_TERMS:
+            found = [term for term in postings if term in doc]
+        else:
+            found = self.scan(doc)
+        for term in found:
+            candidates.update(postings[term])
+        return candidates
+
+    def scan(self, doc):
+        # required terms found in a text in a single pass, with an automaton
+        # built again after queries are added or removed
+        if self._automaton is None:
+            terms = list(self.postings)
+            self._automaton = Automaton(
+                {term: 1 << i for i, term in enumerate(terms)})
+            self._bits = terms
+        mask = self._automaton.scan(doc)
+        found = []
+        while mask:
+            low = mask & -mask
+            found.append(self._bits[low.bit_length() - 1])
+            mask ^= low
+        return found
+
+    def match(self, doc):
+        doc = self.preprocess(doc)
+        queries = self.queries
+        matches = []
+        for key in self.candidates(doc):
+            query = queries[key]
+            if query.query.match(query.matcher.scan(doc)):
+                matches.append(key)
+        return matches
+
+
+def required_terms(node):
+    # terms of which at least one is in every document matching the query
+    # tree, or None if there are none (negated and wildcard terms)
+    if isinstance(node, Entry):
+        if node.not_ or node.rgx is not None:
+            return None
+        return {node.query}
+    if isinstance(node, ANDNOT):
+        return required_terms(node.left)
+    terms = [required_terms(child) for child in node.children]
+    if isinstance(node, OR):
+        if any(child_terms is None for child_terms in terms):
+            return None
+        return set().union(*terms)
+    # any operand of an AND is required: the one with the fewest terms
+    terms = [child_terms for child_terms in terms if child_terms is not None]
+    return min(terms, key=len) if terms else None
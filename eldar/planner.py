@@ -0,0 +1,69 @@
+# rewriting of parsed query trees before evaluation. The same rules apply to
+# the trees of `Query` (operators) and of `Index` (indexops): `ops` is the
+# module holding the AND, ANDNOT and OR classes of the tree
+
+
+def plan(node, ops, cost, order_or=True):
+    # normalized tree whose operands are ordered by increasing `cost`. The
+    # operands of OR nodes are left as is without `order_or`
+    return reorder(normalize(node, ops), ops, cost, order_or)
+
+
+def normalize(node, ops):
+    # flatten AND/OR chains, drop duplicate operands, and apply the AND NOT
+    # clauses under an AND to the intersection of its positive operands:
+    # a AND (b AND NOT c) becomes (a AND b) AND NOT c
+    if isinstance(node, ops.ANDNOT):
+        return ops.ANDNOT(normalize(node.left, ops),
+                          normalize(node.right, ops))
+    if not isinstance(node, (ops.AND, ops.OR)):
+        return node
+
+    children = dedupe([normalize(child, ops) for child in node.children])
+    if isinstance(node, ops.OR):
+        return ops.OR(*children) if len(children) > 1 else children[0]
+
+    positives, negatives = [], []
+    for child in children:
+        while isinstance(child, ops.ANDNOT):
+            negatives.append(child.right)
+            child = child.left
+        positives.append(child)
+    positives = dedupe(ops.AND(*positives).children)
+    node = ops.AND(*positives) if len(positives) > 1 else positives[0]
+    for negative in dedupe(negatives):
+        node = ops.ANDNOT(node, negative)
+    return node
+
+
+def dedupe(nodes):
+    keys = set()
+    unique = []
+    for node in nodes:
+        key = node.key()
+        if key not in keys:
+            keys.add(key)
+            unique.append(node)
+    return unique
+
+
+def reorder(node, ops, cost, order_or=True):
+    if isinstance(node, ops.ANDNOT):
+        return ops.ANDNOT(reorder(node.left, ops, cost, order_or),
+                          reorder(node.right, ops, cost, order_or))
+    if isinstance(node, (ops.AND, ops.OR)):
+        children = [
+            reorder(child, ops, cost, order_or) for child in node.children]
+        if order_or or isinstance(node, ops.AND):
+            children.sort(key=cost)
+        return type(node)(*children)
+    return node
+
+
+def explain(node, estimate, depth=0):
+    # one line per node of the tree, with its estimate
+    operator = getattr(node, "operator", None) or repr(node)
+    lines = ["  " * depth + f"{operator}  [{estimate(node)}]"]
+    for operand in node.operands():
+        lines.extend(explain(operand, estimate, depth + 1))
+    return lines
@@ -0,0 +1,284 @@
+import numpy as np
+
+DOC_DTYPE = np.int32
+OFFSET_DTYPE = np.int64
+
+
+class PostingList:
+    def __init__(self, ids, offsets, positions):
+        # sorted unique doc ids, and for the i-th of them, its positions
+        # are positions[offsets[i]:offsets[i + 1]]
+        self.ids = ids
+        self.offsets = offsets
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_positions(self, i):
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def occurrences(self):
+        # doc id and position of every occurrence, sorted by (doc, position)
+        counts = np.diff(self.offsets)
+        docs = np.repeat(self.ids, counts)
+        positions = self.positions[self.offsets[0]:self.offsets[-1]]
+        return docs, positions
+
+    @property
+    def n_occurrences(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    def restrict(self, doc_ids):
+        # posting list of the sorted `doc_ids` that are present in this one
+        if len(self.ids) == 0 or len(doc_ids) == 0:
+            return PostingList.empty()
+        idx = np.searchsorted(self.ids, doc_ids)
+        idx[idx == len(self.ids)] = 0
+        idx = idx[self.ids[idx] == doc_ids]
+        if len(idx) == len(self.ids):
+            return self
+
+        # gather the positions of the selected documents
+        starts = self.offsets[idx]
+        counts = self.offsets[idx + 1] - starts
+        offsets = np.zeros(len(idx) + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(counts, out=offsets[1:])
+        gather = (np.repeat(starts - offsets[:-1], counts) +
+                  np.arange(offsets[-1], dtype=OFFSET_DTYPE))
+        return PostingList(self.ids[idx], offsets, self.positions[gather])
+
+    @staticmethod
+    def empty():
+        return PostingList(
+            np.empty(0, dtype=DOC_DTYPE),
+            np.zeros(1, dtype=OFFSET_DTYPE),
+            np.empty(0, dtype=DOC_DTYPE))
+
+    @staticmethod
+    def from_occurrences(docs, positions):
+        if len(docs) == 0:
+            return PostingList.empty()
+        order = np.lexsort((positions, docs))
+        docs = docs[order]
+        positions = positions[order]
+        starts = np.flatnonzero(np.diff(docs, prepend=-1))
+        offsets = np.append(starts, len(docs)).astype(OFFSET_DTYPE)
+        return PostingList(docs[starts], offsets, positions)
+
+    @staticmethod
+    def union(posting_lists):
+        posting_lists = [p for p in posting_lists if len(p)]
+        if len(posting_lists) == 0:
+            return PostingList.empty()
+        if len(posting_lists) == 1:
+            return posting_lists[0]
+        docs, positions = zip(*(p.occurrences() for p in posting_lists))
+        return PostingList.from_occurrences(
+            np.concatenate(docs), np.concatenate(positions))
+
+
+class Postings:
+    # posting lists of all terms, stored back to back in flat arrays:
+    # the doc ids of term t are doc_ids[doc_offsets[t]:doc_offsets[t + 1]]
+    def __init__(self, doc_offsets, doc_ids, pos_offsets, positions):
+        self.doc_offsets = doc_offsets
+        self.doc_ids = doc_ids
+        self.pos_offsets = pos_offsets
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.doc_offsets) - 1
+
+    def __getitem__(self, term_id):
+        start = self.doc_offsets[term_id]
+        end = self.doc_offsets[term_id + 1]
+        return PostingList(
+            self.doc_ids[start:end],
+            self.pos_offsets[start:end + 1],
+            self.positions)
+
+    def get_ids(self, term_id):
+        return self.doc_ids[
+            self.doc_offsets[term_id]:self.doc_offsets[term_id + 1]]
+
+    def get_many_ids(self, term_ids):
+        return [self.get_ids(term_id) for term_id in term_ids]
+
+    def get_ids_within(self, term_id, doc_ids):
+        # the sorted doc_ids that hold the term
+        from .setops import contains
+        return doc_ids[contains(self.get_ids(term_id), doc_ids)]
+
+    def document_frequency(self, term_id):
+        return int(
+            self.doc_offsets[term_id + 1] - self.doc_offsets[term_id])
+
+    def document_frequencies(self):
+        return np.diff(self.doc_offsets)
+
+    def doc_lengths(self, n_docs):
+        return np.bincount(
+            self.doc_ids, weights=np.diff(self.pos_offsets),
+            minlength=n_docs).astype(np.int32)
+
+    @property
+    def nbytes(self):
+        return (self.doc_offsets.nbytes + self.doc_ids.nbytes +
+                self.pos_offsets.nbytes + self.positions.nbytes)
+
+    @staticmethod
+    def empty():
+        return Postings(
+            np.zeros(1, dtype=OFFSET_DTYPE),
+            np.empty(0, dtype=DOC_DTYPE),
+            np.zeros(1, dtype=OFFSET_DTYPE),
+            np.empty(0, dtype=DOC_DTYPE))
+
+    @staticmethod
+    def from_stream(term_stream, doc_lengths, n_terms):
+        # `term_stream` holds the term id of every token of every document,
+        # in document order, and `doc_lengths` the token count of each
+        # document: doc ids and positions are implied by the order
+        term_ids = np.frombuffer(term_stream, dtype=np.int32)
+        lengths = np.frombuffer(doc_lengths, dtype=np.int32)
+        n_tokens = len(term_ids)
+
+        doc_starts = np.zeros(len(lengths), dtype=OFFSET_DTYPE)
+        np.cumsum(lengths[:-1], out=doc_starts[1:])
+        docs = np.repeat(np.arange(len(lengths), dtype=DOC_DTYPE), lengths)
+        positions = (np.arange(n_tokens, dtype=OFFSET_DTYPE) -
+                     np.repeat(doc_starts, lengths)).astype(DOC_DTYPE)
+
+        # stable sort keeps (doc, position) order within each term
+        order = np.argsort(term_ids, kind="stable")
+        return Postings.from_sorted(
+            term_ids[order], docs[order], positions[order], n_terms)
+
+    @staticmethod
+    def from_occurrences(term_ids, docs, positions, n_terms):
+        order = np.lexsort((positions, docs, term_ids))
+        return Postings.from_sorted(
+            term_ids[order], docs[order], positions[order], n_terms)
+
+    @staticmethod
+    def from_sorted(term_ids, docs, positions, n_terms):
+        # occurrences sorted by (term, doc, position)
+        n_tokens = len(term_ids)
+        new_pair = np.ones(n_tokens, dtype=bool)
+        new_pair[1:] = ((term_ids[1:] != term_ids[:-1]) |
+                        (docs[1:] != docs[:-1]))
+        pair_starts = np.flatnonzero(new_pair)
+
+        doc_ids = docs[pair_starts].astype(DOC_DTYPE)
+        pos_offsets = np.append(pair_starts, n_tokens).astype(OFFSET_DTYPE)
+        doc_offsets = np.zeros(n_terms + 1, dtype=OFFSET_DTYPE)
+        np.cumsum(np.bincount(term_ids[pair_starts], minlength=n_terms),
+                  out=doc_offsets[1:])
+        return Postings(
+            doc_offsets, doc_ids, pos_offsets, positions.astype(DOC_DTYPE))
+
+    def occurrences(self):
+        # term id, doc id and position of every occurrence
+        pair_terms = np.repeat(
+            np.arange(len(self), dtype=np.int32), np.diff(self.doc_offsets))
+        counts = np.diff(self.pos_offsets)
+        return (np.repeat(pair_terms, counts),
+                np.repeat(self.doc_ids, counts),
+                self.positions[self.pos_offsets[0]:self.pos_offsets[-1]])
+
+
+def positional_keys(posting_list, shift=0):
+    # encode each (doc, position - shift) occurrence as a single integer,
+    # sorted like the occurrences
+    docs, positions = posting_list.occurrences()
+    valid = positions >= shift
+    return ((docs[valid].astype(np.int64) << 32) |
+            (positions[valid].astype(np.int64) - shift))
+
+
+def key_docs(keys):
+    # sorted unique doc ids of sorted keys
+    docs = keys >> 32
+    if len(docs) == 0:
+        return docs.astype(DOC_DTYPE)
+    new_doc = np.ones(len(docs), dtype=bool)
+    np.not_equal(docs[1:], docs[:-1], out=new_doc[1:])
+    return docs[new_doc].astype(DOC_DTYPE)
+
+
+def from_keys(keys):
+    # posting list of sorted keys
+    if len(keys) == 0:
+        return PostingList.empty()
+    docs = keys >> 32
+    starts = np.flatnonzero(np.diff(docs, prepend=-1))
+    offsets = np.append(starts, len(keys)).astype(OFFSET_DTYPE)
+    return PostingList(
+        docs[starts].astype(DOC_DTYPE), offsets,
+        (keys & 0xFFFFFFFF).astype(DOC_DTYPE))
+
+
+def intersect_keys(a, b):
+    # intersection of sorted unique keys: the stable sort of their
+    # concatenation merges the two runs in linear time
+    merged = np.concatenate([a, b])
+    merged.sort(kind="stable")
+    return merged[:-1][merged[1:] == merged[:-1]]
+
+
+def phrase_keys(posting_lists):
+    # keys of the positions where the terms appear consecutively.
+    # Candidates come from the rarest term, and the other terms are only
+    # read in the candidate documents, where the required positions are
+    # binary-searched
+    from .setops import SKIP_RATIO, contains
+
+    if any(len(posting_list) == 0 for posting_list in posting_lists):
+        return np.empty(0, dtype=np.int64)
+    order = sorted(
+        range(len(posting_lists)),
+        key=lambda j: posting_lists[j].n_occurrences)
+    keys = positional_keys(posting_lists[order[0]], order[0])
+    for j in order[1:]:
+        posting_list = posting_lists[j]
+        candidates = key_docs(keys)
+        if len(candidates) * SKIP_RATIO < len(posting_list):
+            token_keys = positional_keys(posting_list.restrict(candidates))
+            keys = keys[contains(token_keys, keys + j)]
+        else:
+            # the lists have similar lengths: merging them is faster
+            keys = intersect_keys(keys, positional_keys(posting_list, j))
+        if len(keys) == 0:
+            break
+    return keys
+
+
+def phrase_starts(posting_lists):
+    return from_keys(phrase_keys(posting_lists))
+
+
+def phrase_ids(posting_lists):
+    # ids of documents where the terms appear at consecutive positions
+    return key_docs(phrase_keys(posting_lists))
+
+
+def followed_ids(left, right, k, left_length=1):
+    # ids of documents where an occurrence of `right` starts at most k
+    # positions after the end of an occurrence of `left`, whose occurrences
+    # span `left_length` positions
+    # the more frequent side is only read in the documents of the other one
+    if len(left) > len(right):
+        left = left.restrict(right.ids)
+    else:
+        right = right.restrict(left.ids)
+    ends = positional_keys(left, 1 - left_length)
+    right_keys = positional_keys(right)
+    if len(ends) == 0 or len(right_keys) == 0:
+        return np.empty(0, dtype=DOC_DTYPE)
+    # first occurrence of `right` after each end; keys of different
+    # documents are at least 2^32 - max position apart
+    idx = np.searchsorted(right_keys, ends, side="right")
+    found = idx < len(right_keys)
+    found[found] = right_keys[idx[found]] - ends[found] <= k
+    return key_docs(ends[found])
@@ -0,0 +1,182 @@
+from time import perf_counter
+
+# functions called with every finished Profile, to export its metrics
+hooks = []
+
+
+def add_hook(hook):
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+
+class NodeProfile:
+    # measurements of a node of a query tree: number of evaluations, wall
+    # time (children included), and cardinalities. For an Index, `inputs`
+    # is the size of the operand results and `outputs` the size of the
+    # result; for a Query, they are the number of documents evaluated by the
+    # node and the number of those that matched
+    def __init__(self, node):
+        self.node = node
+        self.label = getattr(node, "operator", None) or repr(node)
+        self.calls = 0
+        self.seconds = 0.0
+        self.inputs = 0
+        self.outputs = 0
+        self.cache_hits = 0
+        self.expansions = 0
+        self.children = []
+
+    def to_dict(self):
+        return {
+            "node": self.label,
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "cache_hits": self.cache_hits,
+            "expansions": self.expansions,
+            "children": [child.to_dict() for child in self.children]
+        }
+
+    def lines(self, depth=0):
+        line = (f"{'  ' * depth}{self.label}  {self.seconds * 1000:.3f} ms"
+                f"  in {self.inputs}  out {self.outputs}")
+        if self.calls > 1:
+            line += f"  calls {self.calls}"
+        if self.cache_hits:
+            line += f"  cached {self.cache_hits}"
+        if self.expansions:
+            line += f"  expansions {self.expansions}"
+        lines = [line]
+        for child in self.children:
+            lines.extend(child.lines(depth + 1))
+        return lines
+
+
+class Profile:
+    # per-node measurements of the queries run while profiling is on (see
+    # `Index.profile` and `Query.profile`), and global statistics taken when
+    # it ends. Every finished profile is passed to the `hooks`
+    def __init__(self, hooks=()):
+        self.roots = []
+        self.expansions = {}
+        self.stats = {}
+        # seconds spent by a Query on documents before evaluating the tree
+        self.phases = {"preprocess": 0.0, "scan": 0.0}
+        self.hooks = list(hooks)
+        self._stack = []
+        self._nodes = {}
+
+    def evaluate(self, node, evaluate):
+        # result of `evaluate(node)` for an Index, as a child of the node
+        # being evaluated. Operands evaluate their own operands through the
+        # index, so the whole tree is measured
+        stats = NodeProfile(node)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children.append(stats)
+        else:
+            self.roots.append(stats)
+        self._stack.append(stats)
+        start = perf_counter()
+        try:
+            result = evaluate(node)
+        finally:
+            stats.seconds += perf_counter() - start
+            self._stack.pop()
+        stats.calls += 1
+        stats.outputs += len(result)
+        if stats.children:
+            stats.inputs += sum(child.outputs for child in stats.children)
+        else:
+            stats.inputs += stats.outputs
+        return result
+
+    def cache_hit(self):
+        # the node being evaluated was found in the result cache
+        if self._stack:
+            self._stack[-1].cache_hits += 1
+
+    def expand(self, query_term, tokens):
+        self.expansions[query_term] = len(tokens)
+        if self._stack:
+            self._stack[-1].expansions += len(tokens)
+
+    def query(self, query, doc):
+        # `query.evaluate(doc)`, with the time spent to preprocess the
+        # document and find the terms, and the counts of every node
+        start = perf_counter()
+        doc = query.preprocess(doc)
+        scanned = perf_counter()
+        mask = query.matcher.scan(doc)
+        self.phases["preprocess"] += scanned - start
+        self.phases["scan"] += perf_counter() - scanned
+        return self.match(query.query, mask)
+
+    def match(self, node, mask):
+        # Query tree evaluated on the bitmask of a document, as
+        # `node.match(mask)` does, with the counts of every node
+        stats = self._nodes.get(id(node))
+        if stats is None:
+            stats = self._nodes[id(node)] = NodeProfile(node)
+            if self._stack:
+                self._stack[-1].children.append(stats)
+            else:
+                self.roots.append(stats)
+        self._stack.append(stats)
+        start = perf_counter()
+        operator = getattr(node, "operator", None)
+        if operator is None:
+            result = node.match(mask)
+        elif operator == "AND NOT":
+            result = (self.match(node.left, mask) and
+                      not self.match(node.right, mask))
+        elif operator == "AND":
+            result = all(self.match(child, mask) for child in node.children)
+        else:
+            result = any(self.match(child, mask) for child in node.children)
+        stats.seconds += perf_counter() - start
+        self._stack.pop()
+        stats.calls += 1
+        stats.inputs += 1
+        stats.outputs += bool(result)
+        return result
+
+    def finish(self, stats):
+        self.stats = stats
+        for hook in self.hooks + hooks:
+            hook(self)
+
+    def to_dict(self):
+        return {
+            "queries": [root.to_dict() for root in self.roots],
+            "expansions": self.expansions,
+            "phases": self.phases,
+            "stats": self.stats
+        }
+
+    def __str__(self):
+        return "\n".join(
+            line for root in self.roots for line in root.lines())
+
+
+def distribution(values):
+    # summary of a distribution of integers, such as posting lengths
+    import numpy as np
+
+    if len(values) == 0:
+        return {"count": 0}
+    values = np.asarray(values)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "min": int(values.min()),
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "max": int(values.max())
+    }
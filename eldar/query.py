@@ -1,8 +1,13 @@
-from unidecode import unidecode
-import re
-from .regex import WORD_REGEX
+from contextlib import contextmanager
+from functools import lru_cache
+
+from . import operators
+from .analyzer import Analyzer
 from .entry import Entry
-from .operators import AND, ANDNOT, OR
+from .matcher import Matcher
+from .parallel import get_n_jobs, imap_chunks, map_chunks, split
+from .parser import QUERY_CACHE_SIZE, parse
+from .planner import explain, plan
 
 
 class Query:
@@ -11,117 +16,184 @@ class Query:
         query,
         ignore_case=True,
         ignore_accent=True,
-        match_word=True
+        match_word=True,
+        analyzer=None
     ):
         self.ignore_case = ignore_case
         self.ignore_accent = ignore_accent
         self.match_word = match_word
-        self.query = parse_query(query, ignore_case, ignore_accent)
+        if analyzer is None:
+            analyzer = Analyzer(ignore_case, ignore_accent)
+        self.analyzer = analyzer
+        self.source = query
+        # operands are ordered by their number of terms, so that cheap ones
+        # short-circuit the evaluation of the others. All the terms are
+        # searched in a single pass over the document, then the boolean tree
+        # is evaluated on the bitmask of hits
+        self.query, self.matcher = compile_query(query, analyzer, match_word)
+        self._profile = None
 
     def preprocess(self, doc):
-        if self.ignore_case:
-            doc = doc.lower()
-        if self.ignore_accent:
-            doc = unidecode(doc)
+        doc = self.analyzer.normalize(doc)
         if self.match_word:
-            doc = set(re.findall(WORD_REGEX, doc, re.UNICODE))
+            doc = set(self.analyzer.tokenize(doc))
         return doc
 
     def evaluate(self, doc):
+        if self._profile is not None:
+            return self._profile.query(self, doc)
         doc = self.preprocess(doc)
-        return self.query.evaluate(doc)
+        return self.query.match(self.matcher.scan(doc))
+
+    def filter(self, documents, n_jobs=1):
+        import numpy as np
 
-    def filter(self, documents):
-        docs = []
-        for doc in documents:
-            if not self.evaluate(doc):
-                continue
-            docs.append(doc)
-        return docs
+        # pandas Series and NumPy arrays are filtered with a boolean mask
+        if isinstance(documents, np.ndarray) or hasattr(documents, "iloc"):
+            return documents[self.mask(documents, n_jobs)]
+        documents = list(documents)
+        return [
+            doc for doc, match in zip(documents, self.mask(documents, n_jobs))
+            if match]
+
+    def ifilter(
+        self,
+        source,
+        field=None,
+        line_numbers=False,
+        chunk_size=10000,
+        n_jobs=1,
+        encoding="utf8"
+    ):
+        # lazily yield the matches of an iterable, a file object or a file
+        # path (.gz, .bz2 and .xz files are decompressed on the fly). With
+        # `field`, items are json lines and `field` holds the text to match
+        import numpy as np
+
+        from .stream import get_document, iter_chunks, open_lines
+
+        n_jobs = get_n_jobs(n_jobs)
+        with open_lines(source, encoding) as items:
+            chunks = (
+                (self, chunk, field)
+                for chunk in iter_chunks(items, chunk_size))
+            if n_jobs > 1:
+                results = imap_chunks(_match_items, chunks, n_jobs)
+            else:
+                results = ((args, _match_items(args)) for args in chunks)
+
+            line_no = 0
+            for (_, chunk, _), mask in results:
+                for i in np.flatnonzero(mask).tolist():
+                    document = get_document(chunk[i], field)
+                    if line_numbers:
+                        yield line_no + i + 1, document
+                    else:
+                        yield document
+                line_no += len(chunk)
+
+    def mask(self, documents, n_jobs=1):
+        # boolean array of the documents that match the query: each distinct
+        # document is normalized and evaluated only once
+        import numpy as np
+        import pandas as pd
+
+        documents = np.asarray(documents, dtype=object)
+        n_jobs = get_n_jobs(n_jobs)
+        if n_jobs > 1 and len(documents) > 1 and self._profile is None:
+            chunks = split(documents, n_jobs)
+            masks = map_chunks(
+                _mask_chunk, [(self, chunk) for chunk in chunks], n_jobs)
+            return np.concatenate(masks)
+
+        codes, uniques = pd.factorize(documents)
+        if self._profile is not None:
+            matches = np.fromiter(
+                (self.evaluate(doc) for doc in uniques),
+                dtype=bool, count=len(uniques))
+            return np.append(matches, False)[codes]
+        if getattr(self.analyzer, "ignore_case", False):
+            # texts are lowercased in bulk, and those that only differ by
+            # case are deduplicated again (missing values keep code -1)
+            lowered_codes, uniques = pd.factorize(
+                pd.Series(uniques, dtype=object).str.lower())
+            codes = np.append(lowered_codes, -1)[codes]
+        query = self.query
+        scan = self.matcher.scan
+        preprocess = self.preprocess
+        matches = np.fromiter(
+            (query.match(scan(preprocess(doc))) for doc in uniques),
+            dtype=bool, count=len(uniques))
+        # missing values (code -1) never match
+        return np.append(matches, False)[codes]
+
+    def explain(self):
+        # print the plan of the query, with the number of terms of each node
+        print("\n".join(explain(self.query, lambda node: node.cost())))
+
+    @contextmanager
+    def profile(self, hooks=()):
+        # count the documents evaluated and matched by each node of the
+        # query in the block, in this process (see `Index.profile`)
+        from .profiling import Profile
+
+        profile = Profile(hooks)
+        self._profile = profile
+        try:
+            yield profile
+        finally:
+            self._profile = None
+        matcher = self.matcher
+        profile.finish({
+            "terms": len(matcher.terms),
+            "wildcards": len(matcher.wildcards),
+            "automaton": matcher.automaton is not None,
+            "compile_cache": compile_query.cache_info()._asdict()
+        })
 
     def __call__(self, doc):
         return self.evaluate(doc)
 
+    def __getstate__(self):
+        # only the query text is shipped to worker processes, the query is
+        # parsed and compiled again on arrival
+        return {
+            "query": self.source,
+            "ignore_case": self.ignore_case,
+            "ignore_accent": self.ignore_accent,
+            "match_word": self.match_word,
+            "analyzer": self.analyzer
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
     def __repr__(self):
         return self.query.__repr__()
 
 
-def parse_query(query, ignore_case=True, ignore_accent=True):
-    # remove brackets around query
-    if query[0] == '(' and query[-1] == ')':
-        query = strip_brackets(query)
-    # if there are quotes around query, make an entry
-    if query[0] == '"' and query[-1] == '"' and query.count('"') == 1:
-        if ignore_case:
-            query = query.lower()
-        if ignore_accent:
-            query = unidecode(query)
-        return Entry(query)
-
-    # find all operators
-    match = []
-    match_iter = re.finditer(r" (AND NOT|AND|OR) ", query, re.IGNORECASE)
-    for m in match_iter:
-        start = m.start(0)
-        end = m.end(0)
-        operator = query[start+1:end-1].lower()
-        match_item = (start, end)
-        match.append((operator, match_item))
-    match_len = len(match)
-
-    if match_len != 0:
-        # stop at first balanced operation
-        for i, (operator, (start, end)) in enumerate(match):
-            left_part = query[:start]
-            if not is_balanced(left_part):
-                continue
-
-            right_part = query[end:]
-            if not is_balanced(right_part):
-                raise ValueError("Query malformed")
-            break
-
-        if operator == "or":
-            return OR(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-        elif operator == "and":
-            return AND(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-        elif operator == "and not":
-            return ANDNOT(
-                parse_query(left_part, ignore_case, ignore_accent),
-                parse_query(right_part, ignore_case, ignore_accent)
-            )
-    else:
-        if ignore_case:
-            query = query.lower()
-        if ignore_accent:
-            query = unidecode(query)
-        return Entry(query)
-
-
-def strip_brackets(query):
-    count_left = 0
-    for i in range(len(query) - 1):
-        letter = query[i]
-        if letter == "(":
-            count_left += 1
-        elif letter == ")":
-            count_left -= 1
-        if i > 0 and count_left == 0:
-            return query
-
-    if query[0] == "(" and query[-1] == ")":
-        return query[1:-1]
-    return query
-
-
-def is_balanced(query):
-    # are brackets balanced
-    brackets_b = query.count("(") == query.count(")")
-    quotes_b = query.count('"') % 2 == 0
-    return brackets_b and quotes_b
+def _mask_chunk(args):
+    query, documents = args
+    return query.mask(documents)
+
+
+def _match_items(args):
+    from .stream import get_text
+    query, items, field = args
+    return query.mask([get_text(item, field) for item in items])
+
+
+def parse_query(query, ignore_case=True, ignore_accent=True, analyzer=None):
+    if analyzer is None:
+        analyzer = Analyzer(ignore_case, ignore_accent)
+    return parse(
+        query, operators, lambda term: Entry(analyzer.normalize(term)))
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(query, analyzer, match_word):
+    # planned tree of a query and the matcher of its entries, shared by the
+    # Query objects with the same text and normalization
+    tree = plan(parse_query(query, analyzer=analyzer),
+                operators, lambda node: node.cost())
+    return tree, Matcher(tree.entries(), match_word)
@@ -0,0 +1,93 @@
+import numpy as np
+
+# BM25 parameters: term frequency saturation, and length normalization
+K1 = 1.2
+B = 0.75
+
+
+def scoring_entries(node):
+    # the terms and phrases that contribute to the score of a document:
+    # those that are not excluded by an AND NOT
+    from .entry import IndexEntry
+    from .indexops import ANDNOT
+
+    if isinstance(node, IndexEntry):
+        return [node]
+    if isinstance(node, ANDNOT):
+        return scoring_entries(node.left)
+    entries = []
+    for operand in node.operands():
+        entries.extend(scoring_entries(operand))
+    return entries
+
+
+def term_stats(index, query):
+    # number of live documents, their total length, and the document
+    # frequency of each scoring entry of the query: the statistics that
+    # scores depend on, to be summed over the shards of an index
+    dfs = {}
+    for entry in scoring_entries(query):
+        if entry.key() not in dfs:
+            posting_list, _ = entry.occurrences(index)
+            dfs[entry.key()] = len(posting_list)
+    return index.n_live_docs, int(index.doc_lengths.sum()), dfs
+
+
+def top_k(index, query, ids, k=None, k1=K1, b=B, stats=None):
+    # the `k` best of the matching documents `ids` (all of them when k is
+    # None) by decreasing BM25 score, and their scores. Terms are scored
+    # from the most to the least selective one, and documents that cannot
+    # make it into the top k anymore, even with the maximum score of the
+    # remaining terms, are dropped before the next term is read
+    # (MaxScore), so common terms are only read for a few documents.
+    # `stats` are the corpus statistics given by `term_stats`, when the
+    # index is a shard of a larger corpus
+    doc_lengths = index.doc_lengths
+    if stats is None:
+        n_docs, total_length, dfs = (
+            index.n_live_docs, doc_lengths.sum(), None)
+    else:
+        n_docs, total_length, dfs = stats
+    avgdl = max(total_length / max(n_docs, 1), 1.0)
+
+    terms = []
+    for entry in {e.key(): e for e in scoring_entries(query)}.values():
+        posting_list, _ = entry.occurrences(index)
+        if len(posting_list):
+            df = len(posting_list) if dfs is None else dfs[entry.key()]
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # the term frequency part of a score is below k1 + 1
+            terms.append((idf * (k1 + 1), idf, posting_list))
+    terms.sort(key=lambda term: term[0], reverse=True)
+
+    scores = np.zeros(len(ids))
+    alive = np.arange(len(ids))
+    for i, (_, idf, posting_list) in enumerate(terms):
+        # maximum score left to the documents after this term
+        remaining = sum(term[0] for term in terms[i + 1:])
+        # positions in `ids` of the alive documents holding the term
+        alive_ids = ids[alive]
+        if len(posting_list) < len(alive_ids):
+            idx = np.searchsorted(alive_ids, posting_list.ids)
+            idx[idx == len(alive_ids)] = 0
+            posting_list = posting_list.restrict(
+                posting_list.ids[alive_ids[idx] == posting_list.ids])
+        else:
+            posting_list = posting_list.restrict(alive_ids)
+        tf = np.diff(posting_list.offsets)
+        norm = k1 * (1 - b + b * doc_lengths[posting_list.ids] / avgdl)
+        scores[np.searchsorted(ids, posting_list.ids)] += (
+            idf * tf * (k1 + 1) / (tf + norm))
+
+        if k is not None and len(alive) > k:
+            threshold = np.partition(scores[alive], -k)[-k]
+            alive = alive[scores[alive] + remaining >= threshold]
+
+    # best scores first, then smallest ids, so that pages do not overlap
+    if k is not None and len(alive) > k:
+        kth = np.partition(scores[alive], -k)[-k]
+        better = alive[scores[alive] > kth]
+        ties = alive[scores[alive] == kth]
+        alive = np.concatenate([better, ties[:k - len(better)]])
+    order = alive[np.lexsort((ids[alive], -scores[alive]))]
+    return ids[order], scores[order]
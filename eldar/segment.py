@@ -0,0 +1,195 @@
+import numpy as np
+
+from . import setops
+from .postings import DOC_DTYPE, PostingList, Postings
+from .terms import TermDictionary
+
+
+class Segment:
+    # a batch of documents indexed together: its own vocabulary and posting
+    # lists over local doc ids, the global id of each of its documents
+    # (None when local and global ids are the same), the number of tokens
+    # of each document, and tombstones. `dropped` marks the ids of
+    # documents deleted before the segment was merged, which have no postings
+    def __init__(self, terms, postings, n_docs, doc_ids=None,
+                 doc_lengths=None, dropped=None):
+        self.terms = terms
+        self.postings = postings
+        self.n_docs = n_docs
+        self.doc_ids = doc_ids
+        self._doc_lengths = doc_lengths
+        self.deleted = None
+        self.dropped = dropped
+        self._term_dictionary = None
+
+    @staticmethod
+    def from_stream(terms, term_stream, doc_lengths, doc_ids=None):
+        # term ids are reassigned in lexicographic order, so that the
+        # vocabulary can be stored as a sorted term dictionary
+        vocabulary = sorted(terms)
+        rank = np.empty(len(terms), dtype=np.int32)
+        rank[[terms[token] for token in vocabulary]] = np.arange(
+            len(terms), dtype=np.int32)
+        term_stream = rank[np.frombuffer(term_stream, dtype=np.int32)]
+
+        postings = Postings.from_stream(
+            term_stream, doc_lengths, len(terms))
+        return Segment(
+            {token: i for i, token in enumerate(vocabulary)}, postings,
+            len(doc_lengths), doc_ids,
+            np.frombuffer(doc_lengths, dtype=np.int32))
+
+    @staticmethod
+    def merge(segments, n_docs=None):
+        # one segment holding the live documents of `segments`. When n_docs
+        # is given, local ids of the merged segment are the global ids
+        vocabulary = sorted(set().union(*(
+            segment.terms.keys() for segment in segments)))
+        terms = {token: i for i, token in enumerate(vocabulary)}
+
+        term_ids, docs, positions = [], [], []
+        for segment in segments:
+            t, d, p = segment.postings.occurrences()
+            if segment.deleted is not None:
+                live = ~segment.deleted[d]
+                t, d, p = t[live], d[live], p[live]
+            mapping = np.array(
+                [terms[token] for token in segment.terms], dtype=np.int32)
+            term_ids.append(mapping[t])
+            docs.append(segment.global_ids(d))
+            positions.append(p)
+        term_ids = np.concatenate(term_ids)
+        docs = np.concatenate(docs)
+        positions = np.concatenate(positions)
+
+        dropped = None
+        if n_docs is not None:
+            doc_ids = None
+            live = np.zeros(n_docs, dtype=bool)
+            for segment in segments:
+                live[segment.live_ids()] = True
+            if not live.all():
+                dropped = ~live
+        else:
+            doc_ids = np.unique(np.concatenate([
+                segment.live_ids() for segment in segments]))
+            docs = np.searchsorted(doc_ids, docs)
+            n_docs = len(doc_ids)
+        postings = Postings.from_occurrences(
+            term_ids, docs, positions, len(terms))
+        doc_lengths = np.bincount(docs, minlength=n_docs).astype(np.int32)
+        return Segment(
+            terms, postings, n_docs, doc_ids, doc_lengths, dropped)
+
+    @property
+    def doc_lengths(self):
+        # every token is an occurrence, so lengths can be recovered from
+        # the postings of segments loaded without them
+        if self._doc_lengths is None:
+            self._doc_lengths = self.postings.doc_lengths(self.n_docs)
+        return self._doc_lengths
+
+    def compress(self):
+        # store the postings as delta-encoded blocks
+        from .compression import BlockPostings
+
+        if not isinstance(self.postings, BlockPostings):
+            self.postings = BlockPostings.from_postings(self.postings)
+
+    @property
+    def term_dictionary(self):
+        # the vocabulary as a TermDictionary, whose ids are the term ids:
+        # terms are numbered in lexicographic order
+        if self._term_dictionary is None:
+            if isinstance(self.terms, TermDictionary):
+                self._term_dictionary = self.terms
+            else:
+                self._term_dictionary = TermDictionary.from_terms(
+                    list(self.terms))
+        return self._term_dictionary
+
+    def global_ids(self, local_ids):
+        if self.doc_ids is None:
+            return local_ids
+        return self.doc_ids[local_ids]
+
+    def local_ids(self, global_ids):
+        # local ids of the given global ids that belong to this segment
+        global_ids = np.asarray(global_ids, dtype=np.int64)
+        if self.doc_ids is None:
+            return global_ids[(global_ids >= 0) & (global_ids < self.n_docs)]
+        found = setops.contains(self.doc_ids, global_ids)
+        return np.searchsorted(self.doc_ids, global_ids[found])
+
+    def live_ids(self):
+        ids = np.arange(self.n_docs, dtype=DOC_DTYPE)
+        removed = self.deleted
+        if self.dropped is not None:
+            removed = (
+                self.dropped if removed is None else removed | self.dropped)
+        if removed is not None:
+            ids = ids[~removed]
+        return self.global_ids(ids)
+
+    def delete(self, global_ids):
+        local_ids = self.local_ids(global_ids)
+        if len(local_ids) == 0:
+            return
+        if self.deleted is None:
+            self.deleted = np.zeros(self.n_docs, dtype=bool)
+        self.deleted[local_ids] = True
+
+    def term_ids(self, tokens):
+        term_ids = []
+        for token in tokens:
+            term_id = self.terms.get(token)
+            if term_id is not None:
+                term_ids.append(term_id)
+        return term_ids
+
+    def get(self, tokens):
+        posting_list = PostingList.union(
+            [self.postings[term_id] for term_id in self.term_ids(tokens)])
+        if self.deleted is None and self.doc_ids is None:
+            return posting_list
+        docs, positions = posting_list.occurrences()
+        if self.deleted is not None:
+            live = ~self.deleted[docs]
+            docs, positions = docs[live], positions[live]
+        return PostingList.from_occurrences(self.global_ids(docs), positions)
+
+    def get_ids(self, tokens, size=None):
+        # bitmaps are only used when local ids are the global ids
+        if self.deleted is not None or self.doc_ids is not None:
+            size = None
+        ids = setops.union(
+            self.postings.get_many_ids(self.term_ids(tokens)), size)
+        if self.deleted is not None:
+            ids = ids[~self.deleted[ids]]
+        return self.global_ids(ids)
+
+    def get_ids_within(self, tokens, global_ids):
+        # the sorted global_ids that match one of the tokens
+        local_ids = self.local_ids(global_ids)
+        if self.deleted is not None:
+            local_ids = local_ids[~self.deleted[local_ids]]
+        if len(local_ids) == 0:
+            return setops.empty()
+        ids = setops.union([
+            self.postings.get_ids_within(term_id, local_ids)
+            for term_id in self.term_ids(tokens)])
+        return self.global_ids(ids.astype(DOC_DTYPE, copy=False))
+
+    def document_frequency(self, tokens):
+        return sum(
+            self.postings.document_frequency(term_id)
+            for term_id in self.term_ids(tokens))
+
+    @property
+    def nbytes(self):
+        nbytes = self.postings.nbytes
+        for array in (self.doc_ids, self.deleted, self._doc_lengths,
+                      self.dropped):
+            if array is not None:
+                nbytes += array.nbytes
+        return nbytes
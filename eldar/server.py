@@ -0,0 +1,203 @@
+"""Local HTTP/JSON search server.
+
+    python -m eldar.server path/to/index --port 8080
+
+GET /search?q=...[&limit=10&offset=0&rank=1&documents=1] returns the
+matching ids (and scores when ranked, and documents on demand),
+GET /count?q=... the number of matches, and GET /health the status.
+"""
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+
+from .service import MAX_WORKERS, AsyncIndex
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Content Too Large",
+    500: "Internal Server Error"}
+# largest request body read (and skipped), in bytes
+MAX_BODY_SIZE = 1 << 16
+
+
+class HTTPError(Exception):
+    # request that cannot be read, answered with `status` before the
+    # connection is closed
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Server:
+    # minimal HTTP/1.1 server with keep-alive connections, answering from
+    # an AsyncIndex
+    def __init__(self, index, max_workers=MAX_WORKERS):
+        self.index = AsyncIndex(index, max_workers)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await send(writer, e.status, {"error": str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive = request
+                status, body = await self.respond(method, target)
+                await send(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target):
+        url = urlsplit(target)
+        params = {
+            name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path not in ("/search", "/count", "/health"):
+            return 404, {"error": f"no route {url.path}"}
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if "q" not in params:
+            return 400, {"error": "missing query parameter q"}
+        try:
+            if url.path == "/count":
+                return 200, {"count": await self.index.count(params["q"])}
+            return 200, await self.search(params)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": repr(e)}
+
+    async def search(self, params):
+        limit = params.get("limit")
+        return await self.index.read(
+            search, params["q"],
+            rank=params.get("rank", "0") not in ("0", "false"),
+            limit=None if limit is None else int(limit),
+            offset=int(params.get("offset", 0)),
+            with_documents=params.get("documents", "0") not in ("0", "false"))
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def read_request(reader):
+    # (method, target, keep-alive) of the next request of a connection, or
+    # None when the client closed it. Request bodies, of at most
+    # MAX_BODY_SIZE bytes, are skipped
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        return None
+    method, target, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    length = headers.get("content-length", "0")
+    if not (length.isascii() and length.isdigit()):
+        raise HTTPError(400, f"invalid Content-Length {length!r}")
+    length = int(length)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(
+            413, f"request body larger than {MAX_BODY_SIZE} bytes")
+    if length:
+        await reader.readexactly(length)
+    connection = headers.get("connection")
+    if version == "HTTP/1.0":
+        keep_alive = connection == "keep-alive"
+    else:
+        keep_alive = connection != "close"
+    return method, target, keep_alive
+
+
+async def send(writer, status, body, keep_alive):
+    data = json.dumps(body).encode()
+    writer.write((
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        f"\r\n\r\n").encode() + data)
+    await writer.drain()
+
+
+def search(index, query, rank=False, limit=None, offset=0,
+           with_documents=False):
+    # answer to /search. It runs on a worker thread under the read lock, so
+    # that the ids and the documents come from the same state of the index
+    ids = index.search(
+        query, return_ids=True, rank=rank, limit=limit, offset=offset,
+        return_scores=rank)
+    body = {}
+    if rank:
+        ids, scores = ids
+        body["scores"] = scores.tolist()
+    body["ids"] = ids.tolist()
+    if with_documents:
+        body["documents"] = documents(index, ids)
+    return body
+
+
+def documents(index, ids):
+    if hasattr(index, "get_documents"):
+        results = index.get_documents(ids)
+    elif index._is_dataframe:
+        results = index.documents.iloc[ids]
+    else:
+        return [index.documents[i] for i in ids.tolist()]
+    if hasattr(results, "to_dict"):
+        return json.loads(results.to_json(orient="records"))
+    return results
+
+
+def load(path):
+    # an Index, or a ShardedIndex, saved at `path`
+    from .index import Index
+    from .sharded import FORMAT, ShardedIndex
+
+    meta = os.path.join(path, "meta.json")
+    if os.path.isfile(meta):
+        with open(meta) as f:
+            if json.load(f).get("format") == FORMAT:
+                return ShardedIndex.load(path)
+    return Index.load(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("index", help="directory of a saved index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers", type=int, default=MAX_WORKERS,
+        help="threads running the queries")
+    args = parser.parse_args(argv)
+
+    server = Server(load(args.index), args.workers)
+    print(f"serving {args.index} on http://{args.host}:{args.port}",
+          flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
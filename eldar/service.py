@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+# threads running the queries of an AsyncIndex
+MAX_WORKERS = 4
+
+
+class RWLock:
+    # any number of readers, or a single writer. Waiting writers go first,
+    # so that a steady flow of searches cannot starve updates
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class AsyncIndex:
+    # asyncio front end of an Index (or a ShardedIndex). Queries run on a
+    # pool of `max_workers` threads, so they do not block the event loop,
+    # and identical queries in flight at the same time are evaluated once.
+    # Searches run concurrently, and modifications wait for them to end
+    def __init__(self, index, max_workers=MAX_WORKERS):
+        self.index = index
+        self.lock = RWLock()
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="eldar")
+        self._in_flight = {}
+        self.coalesced = 0
+
+    async def search(self, query, **kwargs):
+        # same arguments as Index.search. Coalesced callers share the
+        # result, which must not be modified
+        key = ("search", query, tuple(sorted(kwargs.items())))
+        return await self._coalesce(key, self.index.search, query, **kwargs)
+
+    async def count(self, query):
+        return await self._coalesce(("count", query), self.index.count, query)
+
+    async def read(self, function, *args, **kwargs):
+        # function(index, *args, **kwargs) run under the read lock, for reads
+        # made of several calls that must see the same state of the index.
+        # Identical reads in flight are evaluated once
+        key = ("read", function, args, tuple(sorted(kwargs.items())))
+        return await self._coalesce(
+            key, function, self.index, *args, **kwargs)
+
+    async def build(self, *args, **kwargs):
+        return await self._write(self.index.build, *args, **kwargs)
+
+    async def add(self, *args, **kwargs):
+        return await self._write(self.index.add, *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self._write(self.index.delete, *args, **kwargs)
+
+    async def update(self, *args, **kwargs):
+        return await self._write(self.index.update, *args, **kwargs)
+
+    async def compact(self):
+        return await self._write(self.index.compact)
+
+    async def _coalesce(self, key, function, *args, **kwargs):
+        # in-flight queries are only shared within the event loop thread
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._run(self._locked_read, function, *args, **kwargs))
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a cancelled caller does not cancel the query of the others
+        return await asyncio.shield(future)
+
+    async def _write(self, function, *args, **kwargs):
+        return await self._run(self._locked_write, function, *args, **kwargs)
+
+    def _locked_read(self, function, *args, **kwargs):
+        with self.lock.read():
+            return function(*args, **kwargs)
+
+    def _locked_write(self, function, *args, **kwargs):
+        with self.lock.write():
+            return function(*args, **kwargs)
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(function, *args, **kwargs))
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,129 @@
+import numpy as np
+
+from .bitmap import Bitmap, popcount
+from .postings import DOC_DTYPE
+
+# above this length ratio, the smaller list is binary-searched into the
+# larger one instead of merging both
+SKIP_RATIO = 8
+# results holding more than this fraction of the corpus are stored as
+# bitmaps rather than sorted lists
+BITMAP_DENSITY = 1 / 32
+
+# a set of doc ids is either a sorted array, or a Bitmap when dense: every
+# operation below accepts both, and `size` is the number of documents in
+# the corpus (None to never create bitmaps)
+
+
+def empty():
+    return np.empty(0, dtype=DOC_DTYPE)
+
+
+def is_dense(cardinality, size):
+    return size is not None and cardinality > size * BITMAP_DENSITY
+
+
+def to_ids(docs):
+    if isinstance(docs, Bitmap):
+        return docs.to_ids()
+    return docs
+
+
+def contains(haystack, needles):
+    # mask of the sorted `needles` that are present in sorted `haystack`
+    if len(haystack) == 0:
+        return np.zeros(len(needles), dtype=bool)
+    # needles are sorted, so each binary search starts where the previous
+    # one ended and skips over the parts of haystack that cannot match
+    idx = np.searchsorted(haystack, needles)
+    idx[idx == len(haystack)] = 0
+    return haystack[idx] == needles
+
+
+def intersect(a, b, size=None):
+    a_bitmap = isinstance(a, Bitmap)
+    b_bitmap = isinstance(b, Bitmap)
+    if a_bitmap and b_bitmap:
+        return a & b
+    if a_bitmap:
+        return b[a.contains(b)]
+    if b_bitmap:
+        return a[b.contains(a)]
+
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return empty()
+    if is_dense(len(a), size):
+        return Bitmap.from_ids(a, size) & Bitmap.from_ids(b, size)
+    # skip the head and tail of the larger list outside the smaller's range
+    start = np.searchsorted(b, a[0])
+    end = np.searchsorted(b, a[-1], side="right")
+    b = b[start:end]
+    if len(b) == 0:
+        return empty()
+    if len(b) > SKIP_RATIO * len(a):
+        return a[contains(b, a)]
+    return np.intersect1d(a, b, assume_unique=True)
+
+
+def count_intersection(a, b):
+    # size of the intersection, without building it
+    a_bitmap = isinstance(a, Bitmap)
+    b_bitmap = isinstance(b, Bitmap)
+    if a_bitmap and b_bitmap:
+        return popcount(a.words & b.words)
+    if a_bitmap:
+        return int(np.count_nonzero(a.contains(b)))
+    if b_bitmap:
+        return int(np.count_nonzero(b.contains(a)))
+
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return 0
+    if len(b) > SKIP_RATIO * len(a):
+        return int(np.count_nonzero(contains(b, a)))
+    # the stable sort of the concatenation merges the two sorted lists
+    merged = np.concatenate([a, b])
+    merged.sort(kind="stable")
+    return int(np.count_nonzero(merged[1:] == merged[:-1]))
+
+
+def union(results, size=None):
+    bitmaps = [docs for docs in results if isinstance(docs, Bitmap)]
+    arrays = [
+        docs for docs in results
+        if not isinstance(docs, Bitmap) and len(docs)]
+    if bitmaps:
+        size = bitmaps[0].size
+    elif len(arrays) == 0:
+        return empty()
+    elif len(arrays) == 1:
+        return arrays[0]
+
+    if bitmaps or is_dense(sum(len(docs) for docs in arrays), size):
+        # scatter the lists into a mask instead of sorting their union
+        mask = np.zeros(size, dtype=bool)
+        for docs in arrays:
+            mask[docs] = True
+        result = Bitmap.from_mask(mask)
+        for bitmap in bitmaps:
+            result = result | bitmap
+        return result
+    return np.unique(np.concatenate(arrays))
+
+
+def difference(a, b, size=None):
+    a_bitmap = isinstance(a, Bitmap)
+    b_bitmap = isinstance(b, Bitmap)
+    if a_bitmap and b_bitmap:
+        return a - b
+    if a_bitmap:
+        return a - Bitmap.from_ids(b, a.size)
+    if b_bitmap:
+        return a[~b.contains(a)]
+
+    if len(a) == 0 or len(b) == 0:
+        return a
+    return a[~contains(b, a)]
@@ -0,0 +1,289 @@
+import json
+import os
+
+import numpy as np
+
+from . import setops
+from .cache import CACHE_SIZE
+from .index import Index, parse_query
+from .parallel import get_n_jobs
+from .postings import DOC_DTYPE
+from .ranking import term_stats, top_k
+
+FORMAT = "eldar-sharded-index"
+VERSION = 1
+
+# shards of the index, in the worker processes
+_shards = None
+
+
+class ShardedIndex:
+    # documents partitioned into `n_shards` indexes of consecutive doc ids.
+    # Queries are parsed once, and the tree is sent to a pool of `n_jobs`
+    # worker processes, where each shard plans and evaluates it locally.
+    # Doc ids of shard i are offset by the number of documents of the
+    # previous shards, so merged results stay sorted
+    def __init__(
+        self,
+        n_shards=4,
+        n_jobs=-1,
+        ignore_case=True,
+        ignore_accent=True,
+        ignore_punctuation=True,
+        use_trie=True,
+        use_bitmap=True,
+        analyzer=None,
+        cache_size=CACHE_SIZE,
+        compress=False
+    ):
+        self.n_shards = n_shards
+        self.n_jobs = get_n_jobs(n_jobs)
+        self.shards = [
+            Index(ignore_case, ignore_accent, ignore_punctuation, use_trie,
+                  use_bitmap, analyzer, cache_size, compress)
+            for _ in range(n_shards)]
+        self._pool = None
+
+    @property
+    def analyzer(self):
+        return self.shards[0].analyzer
+
+    @property
+    def offsets(self):
+        # first doc id of each shard, and the total number of documents
+        offsets = np.zeros(len(self.shards) + 1, dtype=np.int64)
+        np.cumsum([shard._n_docs for shard in self.shards], out=offsets[1:])
+        return offsets
+
+    @property
+    def n_live_docs(self):
+        return sum(shard.n_live_docs for shard in self.shards)
+
+    def build(self, documents, column=None, verbose=False, n_jobs=1):
+        # shards are built one after the other, each with `n_jobs`
+        # processes for tokenization
+        bounds = np.linspace(
+            0, len(documents), len(self.shards) + 1).astype(int).tolist()
+        for shard, start, end in zip(self.shards, bounds, bounds[1:]):
+            if isinstance(documents, list):
+                shard.build(documents[start:end], verbose=verbose,
+                            n_jobs=n_jobs)
+            else:
+                shard.build(documents.iloc[start:end], column, verbose,
+                            n_jobs)
+        self.close()
+
+    def add(self, documents, verbose=False, n_jobs=1):
+        # new documents go to the last shard, and get the next ids
+        offset = self.offsets[-2]
+        doc_ids = self.shards[-1].add(documents, verbose, n_jobs)
+        self.close()
+        return doc_ids + offset
+
+    def delete(self, doc_ids):
+        for shard, local_ids, _ in self._split_ids(doc_ids):
+            shard.delete(local_ids)
+        self.close()
+
+    def update(self, doc_ids, documents, verbose=False, n_jobs=1):
+        if len(documents) != len(np.atleast_1d(doc_ids)):
+            raise ValueError("doc_ids and documents have different lengths")
+        for shard, local_ids, positions in self._split_ids(doc_ids):
+            if hasattr(documents, "iloc"):
+                shard_documents = documents.iloc[positions]
+            else:
+                shard_documents = [documents[i] for i in positions]
+            shard.update(local_ids, shard_documents, verbose, n_jobs)
+        self.close()
+
+    def compact(self):
+        for shard in self.shards:
+            shard.compact()
+        self.close()
+
+    def _split_ids(self, doc_ids):
+        # (shard, local ids, positions in doc_ids) for each shard holding
+        # some of the given global ids
+        doc_ids = np.atleast_1d(np.asarray(doc_ids, dtype=np.int64))
+        offsets = self.offsets
+        if len(doc_ids) and (doc_ids.min() < 0 or
+                             doc_ids.max() >= offsets[-1]):
+            raise IndexError("document id out of range")
+        shard_nos = np.searchsorted(offsets, doc_ids, side="right") - 1
+        for shard_no in np.unique(shard_nos).tolist():
+            positions = np.flatnonzero(shard_nos == shard_no)
+            yield (self.shards[shard_no],
+                   doc_ids[positions] - offsets[shard_no], positions)
+
+    def parse(self, query):
+        shard = self.shards[0]
+        return parse_query(query,
+                           ignore_case=shard.ignore_case,
+                           ignore_accent=shard.ignore_accent,
+                           analyzer=shard.analyzer)
+
+    def search(
+        self,
+        query,
+        return_ids=False,
+        rank=False,
+        limit=None,
+        offset=0,
+        return_scores=False
+    ):
+        # same results as an Index of all the documents
+        query = self.parse(query)
+        end = None if limit is None else offset + limit
+        offsets = self.offsets
+        if rank or return_scores:
+            # scores depend on corpus statistics, summed over the shards
+            # before each shard ranks its own matches
+            stats = self._map(_shard_term_stats, query)
+            dfs = {}
+            for _, _, shard_dfs in stats:
+                for key, df in shard_dfs.items():
+                    dfs[key] = dfs.get(key, 0) + df
+            stats = (sum(stat[0] for stat in stats),
+                     sum(stat[1] for stat in stats), dfs)
+            results = self._map(_shard_top_k, query, end, stats)
+            ids = np.concatenate([
+                shard_ids + offsets[i]
+                for i, (shard_ids, _) in enumerate(results)])
+            scores = np.concatenate([scores for _, scores in results])
+            # each shard returns its best `end` matches
+            order = np.lexsort((ids, -scores))[offset:end]
+            ids, scores = ids[order], scores[order]
+        else:
+            ids = np.concatenate([
+                shard_ids.astype(np.int64) + offsets[i]
+                for i, shard_ids in enumerate(
+                    self._map(_shard_ids, query))])[offset:end]
+
+        if return_ids:
+            # read-only doc ids, as returned by Index.search
+            results = ids.astype(DOC_DTYPE)
+            results.setflags(write=False)
+        else:
+            results = self.get_documents(ids)
+        if return_scores:
+            return results, scores
+        return results
+
+    def count(self, query):
+        return sum(self._map(_shard_count, self.parse(query)))
+
+    def get_documents(self, doc_ids):
+        # documents of the given global ids, as a list or a DataFrame
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        offsets = self.offsets
+        shard_nos = np.searchsorted(offsets, doc_ids, side="right") - 1
+        if not self.shards[0]._is_dataframe:
+            return [
+                self.shards[shard_no].documents[doc_id - offsets[shard_no]]
+                for shard_no, doc_id in zip(
+                    shard_nos.tolist(), doc_ids.tolist())]
+
+        import pandas as pd
+        frames, positions = [], []
+        for shard_no in np.unique(shard_nos).tolist():
+            shard_positions = np.flatnonzero(shard_nos == shard_no)
+            frames.append(self.shards[shard_no].documents.iloc[
+                doc_ids[shard_positions] - offsets[shard_no]])
+            positions.append(shard_positions)
+        if not frames:
+            return self.shards[0].documents.iloc[:0]
+        order = np.argsort(np.concatenate(positions), kind="stable")
+        return pd.concat(frames).iloc[order]
+
+    def _map(self, function, query, *args):
+        # function(shard, query, *args) for every shard, in the worker
+        # processes when there are several
+        if self.n_jobs > 1 and len(self.shards) > 1:
+            return list(self._executor().map(_run_shard, [
+                (function, shard_no, query, args)
+                for shard_no in range(len(self.shards))]))
+        return [function(shard, query, *args) for shard in self.shards]
+
+    def _executor(self):
+        # workers are started on first use, with a copy of the shards, and
+        # stopped whenever the shards change
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(
+                min(self.n_jobs, len(self.shards)),
+                initializer=_set_shards, initargs=(self.shards,))
+        return self._pool
+
+    def close(self):
+        # stop the worker processes
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def save(self, path):
+        # one index directory per shard
+        os.makedirs(path, exist_ok=True)
+        for i, shard in enumerate(self.shards):
+            shard.save(os.path.join(path, f"shard_{i}"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "format": FORMAT,
+                "version": VERSION,
+                "n_shards": len(self.shards)
+            }, f)
+        self.close()
+
+    @staticmethod
+    def load(path, n_jobs=-1):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"{path} is not a sharded eldar index")
+        index = ShardedIndex.__new__(ShardedIndex)
+        index.n_shards = meta["n_shards"]
+        index.n_jobs = get_n_jobs(n_jobs)
+        index.shards = [
+            Index.load(os.path.join(path, f"shard_{i}"))
+            for i in range(meta["n_shards"])]
+        index._pool = None
+        return index
+
+
+def _set_shards(shards):
+    global _shards
+    _shards = shards
+
+
+def _run_shard(args):
+    function, shard_no, query, args = args
+    return function(_shards[shard_no], query, *args)
+
+
+def _shard_ids(shard, query):
+    return setops.to_ids(shard.evaluate(shard.plan(query))).astype(
+        DOC_DTYPE, copy=False)
+
+
+def _shard_count(shard, query):
+    return shard.count(query)
+
+
+def _shard_term_stats(shard, query):
+    return term_stats(shard, shard.plan(query))
+
+
+def _shard_top_k(shard, query, k, stats):
+    query = shard.plan(query)
+    ids = setops.to_ids(shard.evaluate(query))
+    return top_k(shard, query, ids, k, stats=stats)
@@ -0,0 +1,237 @@
+import json
+import os
+import pickle
+import shutil
+from bisect import bisect_right
+
+import numpy as np
+
+from . import compression
+from .analyzer import Analyzer
+from .compression import BlockPostings
+from .postings import Postings
+from .segment import Segment
+from .terms import TermDictionary, pack
+
+# an index is saved as a directory of flat binary files, memory-mapped on
+# load so that postings are paged in lazily and shared between processes
+FORMAT = "eldar-index"
+VERSION = 1
+SETTINGS = [
+    "ignore_case", "ignore_accent", "ignore_punctuation", "use_trie",
+    "use_bitmap", "compress"]
+POSTINGS = ["doc_offsets", "doc_ids", "pos_offsets", "positions"]
+
+
+class DocumentStore:
+    # list of texts stored back to back in utf-8 buffers. The buffer of a
+    # loaded index is memory-mapped: texts added later are packed in new
+    # chunks, and replaced ones kept apart, so that it is never copied
+    def __init__(self, data, offsets):
+        self.chunks = [(data, offsets)]
+        # doc id of the first text of each chunk, and the number of texts
+        self.starts = [0, len(offsets) - 1]
+        self.replaced = {}
+
+    @staticmethod
+    def from_texts(texts):
+        return DocumentStore(*pack(texts))
+
+    def extend(self, texts):
+        data, offsets = pack(texts)
+        if len(offsets) > 1:
+            self.chunks.append((data, offsets))
+            self.starts.append(self.starts[-1] + len(offsets) - 1)
+
+    def pack(self):
+        # (data, offsets) of all the texts, in a single buffer
+        if self.replaced:
+            return pack(self)
+        if len(self.chunks) == 1:
+            return self.chunks[0]
+        data = np.concatenate([
+            data[offsets[0]:offsets[-1]] for data, offsets in self.chunks])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        for _, chunk_offsets in self.chunks:
+            offsets.append(
+                chunk_offsets[1:] - chunk_offsets[0] + offsets[-1][-1])
+        return data, np.concatenate(offsets)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        if i in self.replaced:
+            return self.replaced[i]
+        chunk = 0
+        if len(self.chunks) > 1:
+            chunk = bisect_right(self.starts, i) - 1
+        data, offsets = self.chunks[chunk]
+        i -= self.starts[chunk]
+        return data[offsets[i]:offsets[i + 1]].tobytes().decode("utf8")
+
+    def __setitem__(self, i, text):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        self.replaced[i] = text
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def save_index(index, path):
+    # files are written to a temporary directory that then replaces `path`,
+    # so that an index can be saved over the files it was loaded from
+    path = os.path.abspath(path)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    meta = {
+        "format": FORMAT,
+        "version": VERSION,
+        "n_docs": index._n_docs,
+        "documents": "dataframe" if index._is_dataframe else "list",
+        "columns": list(index._columns),
+        "column": index._column
+    }
+    for setting in SETTINGS:
+        meta[setting] = getattr(index, setting)
+    if type(index.analyzer) is not Analyzer:
+        # custom analyzers are pickled alongside the index
+        with open(os.path.join(tmp_path, "analyzer.pkl"), "wb") as f:
+            pickle.dump(index.analyzer, f)
+
+    # deleted documents are dropped and all segments merged into one
+    index.compact()
+    segment = index._segments[0]
+    terms = segment.terms
+    if not isinstance(terms, TermDictionary):
+        terms = TermDictionary.from_terms(list(terms))
+    _save_array(tmp_path, "terms", terms.data)
+    _save_array(tmp_path, "term_offsets", terms.offsets)
+    if isinstance(segment.postings, BlockPostings):
+        meta["postings"] = "blocks"
+        names = compression.ARRAYS
+    else:
+        names = POSTINGS
+    for name in names:
+        _save_array(tmp_path, name, getattr(segment.postings, name))
+    _save_array(tmp_path, "doc_lengths", segment.doc_lengths)
+    if segment.dropped is not None:
+        _save_array(tmp_path, "dropped", segment.dropped)
+
+    if index._is_dataframe:
+        index.documents.to_pickle(os.path.join(tmp_path, "documents.pkl"))
+    else:
+        documents = index.documents
+        if isinstance(documents, DocumentStore):
+            data, offsets = documents.pack()
+        else:
+            data, offsets = pack(documents)
+        _save_array(tmp_path, "documents", data)
+        _save_array(tmp_path, "document_offsets", offsets)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, default=str)
+
+    if os.path.exists(path):
+        old_path = path + ".old"
+        if os.path.exists(old_path):
+            _remove(old_path)
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        # mapped files stay readable after being unlinked
+        _remove(old_path)
+    else:
+        os.rename(tmp_path, path)
+
+
+def load_index(path, index):
+    if os.path.isfile(path):
+        raise ValueError(
+            f"{path} was pickled by an earlier version of eldar, whose "
+            "indexes cannot be loaded: re-build the index and save it again")
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT:
+        raise ValueError(f"{path} is not an eldar index")
+    if meta["version"] > VERSION:
+        raise ValueError(
+            f"index format version {meta['version']} is not supported "
+            f"(latest is {VERSION})")
+
+    # settings added after an index was saved keep their default
+    settings = {
+        setting: meta[setting] for setting in SETTINGS if setting in meta}
+    analyzer_file = os.path.join(path, "analyzer.pkl")
+    if os.path.exists(analyzer_file):
+        with open(analyzer_file, "rb") as f:
+            settings["analyzer"] = pickle.load(f)
+    index.__init__(**settings)
+    index._n_docs = meta["n_docs"]
+    terms = TermDictionary(
+        _load_array(path, "terms"), _load_array(path, "term_offsets"))
+    if meta.get("postings") == "blocks":
+        postings = BlockPostings(*[
+            _load_array(path, name) for name in compression.ARRAYS])
+    else:
+        postings = Postings(*[
+            _load_array(path, name) for name in POSTINGS])
+    # document lengths are recomputed for indexes saved without them
+    doc_lengths = None
+    if os.path.exists(os.path.join(path, "doc_lengths.npy")):
+        doc_lengths = _load_array(path, "doc_lengths")
+    # ids of documents deleted before the index was saved
+    dropped = None
+    if os.path.exists(os.path.join(path, "dropped.npy")):
+        dropped = _load_array(path, "dropped")
+    index._segments = [
+        Segment(terms, postings, index._n_docs, doc_lengths=doc_lengths,
+                dropped=dropped)]
+
+    if meta["documents"] == "dataframe":
+        import pandas as pd
+        # the dataframe is only unpickled when documents are first needed
+        filename = os.path.join(path, "documents.pkl")
+        index.documents = lambda: pd.read_pickle(filename)
+        index._is_dataframe = True
+        index._columns = meta["columns"]
+        index._column = meta.get("column")
+    else:
+        index.documents = DocumentStore(
+            _load_array(path, "documents"),
+            _load_array(path, "document_offsets"))
+    return index
+
+
+def _remove(path):
+    # a saved index, or a file such as an index pickled by earlier versions
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _save_array(path, name, array):
+    np.save(os.path.join(path, name + ".npy"), np.asarray(array),
+            allow_pickle=False)
+
+
+def _load_array(path, name):
+    filename = os.path.join(path, name + ".npy")
+    try:
+        return np.load(filename, mmap_mode="r", allow_pickle=False)
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        return np.load(filename, allow_pickle=False)
@@ -0,0 +1,66 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+from contextlib import contextmanager
+from itertools import islice
+
+BUFFER_SIZE = 1 << 20
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+@contextmanager
+def open_lines(source, encoding="utf8"):
+    # iterate over the lines of a path (possibly compressed), of a file
+    # object, or over the items of any other iterable
+    if isinstance(source, (str, os.PathLike)):
+        extension = os.path.splitext(os.fspath(source))[1]
+        if extension in OPENERS:
+            raw = io.BufferedReader(
+                OPENERS[extension](source, "rb"), BUFFER_SIZE)
+        else:
+            raw = open(source, "rb", buffering=BUFFER_SIZE)
+        with io.TextIOWrapper(raw, encoding=encoding) as f:
+            yield f
+    elif hasattr(source, "read") and not isinstance(source, io.TextIOBase):
+        # binary file object, left open for the caller
+        f = io.TextIOWrapper(source, encoding=encoding)
+        try:
+            yield f
+        finally:
+            f.detach()
+    else:
+        yield source
+
+
+def iter_chunks(items, chunk_size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_text(item, field=None):
+    if field is None:
+        if isinstance(item, str):
+            return item.rstrip("\r\n")
+        return item
+    if isinstance(item, str):
+        if not item.strip():
+            return None
+        item = json.loads(item)
+    return item.get(field)
+
+
+def get_document(item, field=None):
+    # what is yielded for a matching item: the line without its line break
+    # or, for json lines, the parsed record
+    if isinstance(item, str):
+        if field is None:
+            return item.rstrip("\r\n")
+        return json.loads(item)
+    return item
@@ -0,0 +1,107 @@
+from bisect import bisect_left
+
+import numpy as np
+
+
+class TermDictionary:
+    # immutable sorted vocabulary: the utf-8 encoded terms are stored back
+    # to back in a single buffer, and the id of a term is its rank. Terms
+    # sharing a prefix have consecutive ids, found by binary search
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._keys = _EncodedTerms(self)
+
+    @staticmethod
+    def from_terms(terms):
+        return TermDictionary(*pack(terms))
+
+    def encoded(self, term_id):
+        start = self.offsets[term_id]
+        end = self.offsets[term_id + 1]
+        return self.data[start:end].tobytes()
+
+    def term(self, term_id):
+        return self.encoded(term_id).decode("utf8")
+
+    def get(self, term, default=None):
+        # utf-8 preserves code point order, so the encoded terms are sorted
+        key = term.encode("utf8")
+        term_id = bisect_left(self._keys, key)
+        if term_id < len(self) and self.encoded(term_id) == key:
+            return term_id
+        return default
+
+    def prefix_range(self, prefix):
+        # ids [start, end) of the terms starting with `prefix`
+        key = prefix.encode("utf8")
+        start = bisect_left(self._keys, key)
+        # no utf-8 byte is 0xff, so the terms with the prefix sort before it
+        end = bisect_left(self._keys, key + b"\xff", start)
+        return start, end
+
+    def terms(self, start=0, end=None):
+        # terms of ids [start, end), decoded from a single copy of their bytes
+        if end is None:
+            end = len(self)
+        offsets = self.offsets[start:end + 1].tolist()
+        if len(offsets) < 2:
+            return []
+        base = offsets[0]
+        data = self.data[base:offsets[-1]].tobytes()
+        return [
+            data[i - base:j - base].decode("utf8")
+            for i, j in zip(offsets[:-1], offsets[1:])]
+
+    def expand(self, pattern):
+        # terms starting with the literal prefix of a wildcard pattern, a
+        # superset of its matches, or the term itself if it has no wildcard
+        if "*" not in pattern:
+            return [pattern] if pattern in self else []
+        return self.terms(*self.prefix_range(pattern[:pattern.index("*")]))
+
+    def __getitem__(self, term):
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield data[start:end].decode("utf8")
+
+    def keys(self):
+        return iter(self)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class _EncodedTerms:
+    # sequence view used to binary search the encoded terms
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+
+    def __getitem__(self, term_id):
+        return self.dictionary.encoded(term_id)
+
+    def __len__(self):
+        return len(self.dictionary)
+
+
+def pack(strings):
+    # utf-8 encode strings back to back, with the offsets of each string
+    encoded = [string.encode("utf8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
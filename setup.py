@@ -23,6 +23,7 @@ setup(
     ],
     install_requires=[
         'Unidecode >= 1.2.0',
+        'numpy >= 1.19.0',
         'pandas >= 1.1.3',
         'setuptools >= 50.3.0',
     ],
@@ -0,0 +1,64 @@
+import os
+import re
+import tempfile
+
+from unidecode import unidecode
+
+from eldar import Index, Query
+from eldar.analyzer import PUNCTUATION, Analyzer
+
+texts = [
+    "Frodo Baggins",
+    "Éowyn of Rohan, shieldmaiden",
+    "Ça   va, à  Minas Tirith?",
+    "  Gandalf  le Gris ",
+    "Smaug's hoard: gold & gems!",
+    "",
+]
+
+# ascii texts skip transliteration, accented words are transliterated one
+# by one: both give the same text as the whole pipeline applied at once
+analyzer = Analyzer()
+for text in texts:
+    assert analyzer.normalize(text) == unidecode(text.lower())
+assert Analyzer(ignore_case=False).normalize("Éowyn") == "Eowyn"
+assert Analyzer(ignore_accent=False).normalize("Éowyn") == "éowyn"
+
+# punctuation is stripped from tokens, not from the text
+stripped = Analyzer(ignore_punctuation=True)
+table = str.maketrans("", "", PUNCTUATION)
+for text in texts:
+    assert stripped.analyze(text) == [
+        token.translate(table) for token in analyzer.analyze(text)]
+# punctuation tokens become empty, so that positions are kept
+assert stripped.analyze("Smaug's hoard!") == ["smaug", "", "s", "hoard", ""]
+
+
+class StemAnalyzer:
+    # custom analyzer: lowercase words, with a trailing "s" removed
+    def normalize(self, text):
+        return text.lower()
+
+    def tokenize(self, text):
+        return [word.rstrip("s") for word in re.findall(r"\w+", text)]
+
+    def strip_punctuation(self, token):
+        return token
+
+
+stem = StemAnalyzer()
+documents = ["Hobbits of the Shire", "A hobbit hole", "The Rings"]
+assert Query('"hobbit"', analyzer=stem)(documents[0])
+assert not Query('"hobbit"')(documents[0])
+
+# custom analyzers are saved with the index
+index = Index(analyzer=stem)
+index.build(documents)
+assert index.search("hobbit") == documents[:2]
+with tempfile.TemporaryDirectory() as tmp:
+    index.save(os.path.join(tmp, "index"))
+    loaded = Index.load(os.path.join(tmp, "index"))
+    assert isinstance(loaded.analyzer, StemAnalyzer)
+    assert loaded.search("hobbit") == documents[:2]
+    assert loaded.search("ring") == documents[2:]
+    del loaded
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from eldar import Index
 
 documents = [
@@ -12,8 +15,101 @@ documents = [
 index = Index()
 index.build(documents)  # no copy is made
 
-index.save("index.p")  # but documents are copied to disk
-index = Index.load("index.p")
+# saved indexes are written to a temporary directory, removed at the end
+tmp = tempfile.TemporaryDirectory()
+index.save(os.path.join(tmp.name, "index"))  # but documents are copied to disk
+index = Index.load(os.path.join(tmp.name, "index"))
 
 # support for wildcard
 print(index.search('"frodo baggins" AND NOT "elijah"'))
+
+# leading and infix wildcards
+assert index.count('"*odo"') == 3
+assert index.count('"g*alf"') == 2
+assert index.count('"*ob*"') == 1
+
+# proximity operators
+assert index.count('frodo W/1 baggins') == 2
+assert index.count('baggins W/1 frodo') == 0
+assert index.count('baggins NEAR/1 frodo') == 2
+assert index.count('hobbit NEAR/4 frodo') == 1
+assert index.count('hobbit NEAR/3 frodo') == 0
+assert index.count('"frodo baggins" W/2 "a hobbit"') == 1
+
+# query plans: duplicates are dropped, AND NOT is applied last
+index.explain('frodo AND (baggins AND NOT hobbit) AND frodo')
+assert repr(index.plan('frodo AND (baggins AND NOT hobbit) AND frodo')) == \
+    '(("baggins") AND ("frodo")) AND NOT ("hobbit")'
+
+# ranked search: documents where the terms are frequent and the text short
+# come first
+results, scores = index.search(
+    "frodo OR baggins", rank=True, limit=2, return_scores=True)
+print(results, scores)
+assert results == ["Frodo Baggins is a hobbit",
+                   "Elijah Wood was cast as Frodo Baggins in Jackson's adaptation"]
+assert list(index.search("frodo", return_ids=True, limit=2, offset=1)) == [3, 5]
+
+# returned ids are read-only: the postings they may share cannot be changed
+built = Index()
+built.build(documents)
+ids = built.search("frodo", return_ids=True)
+try:
+    ids[:] = 1
+except ValueError:
+    pass
+assert list(built.search("frodo", return_ids=True)) == [1, 3, 5]
+assert built.count('"frodo baggins"') == 2
+
+# profiling: measurements of each node of the queries
+with index.profile() as profile:
+    index.search('"frod*" AND hobbit')
+print(profile)
+root = profile.to_dict()["queries"][0]
+assert root["node"] == "AND" and root["outputs"] == 1
+assert profile.expansions == {"frod*": 1}
+assert profile.stats["n_docs"] == len(documents)
+
+# sharded index: same results as a single index
+from eldar import ShardedIndex
+
+sharded = ShardedIndex(n_shards=2, n_jobs=1)
+sharded.build(documents)
+single = Index()
+single.build(documents)
+for query in ["frodo", "frodo OR gandalf", '"lord of the rings"']:
+    assert sharded.search(query) == single.search(query)
+    assert sharded.count(query) == single.count(query)
+    assert sharded.search(query, rank=True, limit=2) == \
+        single.search(query, rank=True, limit=2)
+    for kwargs in [{}, {"rank": True, "limit": 2}]:
+        ids = sharded.search(query, return_ids=True, **kwargs)
+        expected = single.search(query, return_ids=True, **kwargs)
+        assert ids.dtype == expected.dtype and not ids.flags.writeable
+        assert list(ids) == list(expected)
+
+# compressed postings: same results, in memory and once saved
+compressed = Index(compress=True)
+compressed.build(documents)
+# (to another directory than the loaded index, whose files are still mapped)
+compressed.save(os.path.join(tmp.name, "compressed"))
+for index in [compressed, Index.load(os.path.join(tmp.name, "compressed"))]:
+    for query in ["frodo", '"lord of the rings" AND NOT gandalf',
+                  "frodo W/1 baggins", '"*odo" AND hobbit']:
+        assert index.search(query) == single.search(query)
+    assert index.search("frodo OR baggins", rank=True, limit=2) == \
+        single.search("frodo OR baggins", rank=True, limit=2)
+
+# empty compressed indexes
+for i, documents in enumerate([[], [""]]):
+    empty = Index(compress=True)
+    empty.build(documents)
+    path = os.path.join(tmp.name, f"empty{i}")
+    empty.save(path)
+    empty = Index.load(path)
+    assert empty.search("frodo") == [] and empty.count('"frod*"') == 0
+    empty.add(["Frodo Baggins"])
+    assert empty.search("frodo") == ["Frodo Baggins"]
+
+del index, empty
+tmp.cleanup()
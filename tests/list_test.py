@@ -34,3 +34,80 @@ print(query(documents[0]))
 # >>> True
 print(query(documents[2]))
 # >>> False
+
+# nested brackets, and operators within quotes
+query = Query(
+    '(("gandalf")) AND NOT ("peter jackson" OR "lord of the rings")',
+    match_word=False)
+assert query.filter(documents) == []
+assert Query('"lord of the rings" AND "the main character"',
+             match_word=False)(documents[1])
+
+# operators where a term is expected, or ending the query, are words
+assert repr(Query("AND frodo")) == '"and frodo"'
+assert repr(Query("frodo AND")) == '"frodo and"'
+assert repr(Query("sam OR frodo AND NOT")) == '("sam") OR ("frodo and not")'
+assert Query("frodo AND", match_word=False)("Frodo and Sam")
+assert not Query("frodo AND", match_word=False)("Frodo Baggins")
+assert Query("AND frodo", match_word=False)("Sam and Frodo")
+
+# proximity operators are only operators for Index: Query reads them as words
+assert Query('shipping w/2 days', match_word=False)("free shipping w/2 days")
+
+# large generated queries
+query = Query(" OR ".join(f'"term{i}"' for i in range(5000)) + ' OR "frodo"')
+assert len(query.filter(documents)) == 2
+
+# many terms are searched with one automaton, and wildcards with one regex:
+# same matches as the terms searched one by one
+import random
+
+from eldar.matcher import AUTOMATON_MIN_TERMS
+
+random.seed(0)
+letters = "abehis"
+texts = ["".join(random.choice(letters + "  ") for _ in range(30))
+         for _ in range(200)]
+texts += ["he said his", "ushers", "she is his and hers", "this he"]
+terms = sorted({"".join(random.choice(letters) for _ in range(4))
+                for _ in range(100)} | {"he", "she", "hers", "his"})
+assert len(terms) >= AUTOMATON_MIN_TERMS
+for match_word in [False, True]:
+    singles = {term: Query(f'"{term}"', match_word=match_word)
+               for term in terms}
+    any_term = Query(" OR ".join(f'"{term}"' for term in terms),
+                     match_word=match_word)
+    all_terms = Query('"he" AND "his" AND NOT "hers"', match_word=match_word)
+    for text in texts:
+        assert any_term(text) == any(
+            query(text) for query in singles.values())
+        assert all_terms(text) == (
+            singles["he"](text) and singles["his"](text) and
+            not singles["hers"](text))
+
+    patterns = ["a*b", "*is", "he*", "b*e", "*h*s"]
+    singles = [Query(f'"{pattern}"', match_word=match_word)
+               for pattern in patterns]
+    any_pattern = Query(" OR ".join(f'"{pattern}"' for pattern in patterns),
+                        match_word=match_word)
+    for text in texts:
+        assert any_pattern(text) == any(query(text) for query in singles)
+        for i, query in enumerate(singles):
+            both = Query(f'"{patterns[i]}" AND "{patterns[i - 1]}"',
+                         match_word=match_word)
+            assert both(text) == (query(text) and singles[i - 1](text))
+
+# many queries matched against each document
+from eldar import QuerySet
+
+rules = QuerySet()
+rules.add('"gandalf" AND NOT "movies"', key="gandalf")
+rules.add('"frodo" OR "elijah"', key="frodo")
+rules.add('not gandalf', key="no gandalf")
+assert rules.match(documents[0]) == ["gandalf"]
+assert rules.match(documents[3]) == ["frodo", "no gandalf"]
+rules.remove("frodo")
+assert rules.match(documents[3]) == ["no gandalf"]
+assert all(
+    rules.match(doc) == [key for key in rules.queries if rules[key](doc)]
+    for doc in documents)
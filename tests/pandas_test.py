@@ -22,3 +22,28 @@ query = Query(
 # You can filter a dataframe using pandas mask syntax:
 df = df[df.content.apply(query)]
 print(df)
+
+# `mask` evaluates the whole column at once:
+assert (query.mask(df.content) == df.content.apply(query)).all()
+print(query.filter(df.content))
+
+# facets: number of matches of an indexed query for each value of a column
+from eldar import Index
+
+df = pd.DataFrame({
+    "content": [
+        "Gandalf is a wizard",
+        "Frodo is a hobbit",
+        "Frodo and Gandalf leave the Shire",
+        "Sam is a hobbit"],
+    "race": ["maia", "hobbit", "hobbit", "hobbit"],
+    "date": pd.to_datetime([
+        "2001-12-19 10:00", "2001-12-19 20:00", "2002-12-18 10:00",
+        "2003-12-17 10:00"])})
+index = Index(ignore_case=True)
+index.build(df, column="content")
+assert index.count("frodo OR gandalf") == 3
+assert index.count("frodo AND gandalf") == 1
+assert index.facet("frodo OR gandalf", "race").to_dict() == {
+    "hobbit": 2, "maia": 1}
+assert index.facet("frodo OR gandalf", "date", freq="D").tolist() == [2, 1]
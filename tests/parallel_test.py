@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from eldar import Index, Query
+
+words = ["frodo", "Gandalf", "sam", "ring", "movie", "Éowyn", "hobbit", "the"]
+
+
+def make_documents(n):
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(words, 8)) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    documents = make_documents(2000)
+
+    # the query is pickled to the workers, chunks come back in order
+    query = Query('("frodo" OR "eowyn") AND NOT "movie"', match_word=False)
+    series = pd.Series(documents, index=range(10, 2010), dtype=object)
+    series[::7] = None  # missing values never match
+    mask = query.mask(series, n_jobs=1)
+    assert mask.any() and not mask[::7].any()
+    assert (query.mask(series, n_jobs=2) == mask).all()
+    assert query.filter(series, n_jobs=2).equals(series[mask])
+    assert query.filter(documents, n_jobs=2) == query.filter(documents)
+    assert list(query.ifilter(documents, chunk_size=100, n_jobs=2)) == \
+        query.filter(documents)
+
+    # same postings, whether documents are tokenized by one or two workers
+    single, parallel = Index(), Index()
+    single.build(documents)
+    parallel.build(documents, n_jobs=2)
+    assert parallel.vocabulary() == single.vocabulary()
+    for text in ["frodo", "gandalf AND NOT movie", '"sam ring"', '"*wyn"']:
+        assert list(parallel.search(text, return_ids=True)) == \
+            list(single.search(text, return_ids=True))
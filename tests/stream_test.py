@@ -0,0 +1,34 @@
+import gzip
+import json
+import os
+import tempfile
+
+from eldar import Query
+
+records = [
+    {"id": 1, "text": "Frodo Baggins is a hobbit"},
+    {"id": 2, "text": "Gandalf is a wizard"},
+    {"id": 3, "text": "Sam follows Frodo to Mordor"},
+]
+
+# json lines, compressed, with a blank line that never matches
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "records.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf8") as f:
+        f.write(json.dumps(records[0]) + "\n")
+        f.write("\n")
+        for record in records[1:]:
+            f.write(json.dumps(record) + "\n")
+
+    query = Query('"frodo" AND NOT "wizard"')
+    # matches are streamed with their line number
+    matches = list(query.ifilter(path, field="text", line_numbers=True))
+    print(matches)
+    assert matches == [(1, records[0]), (4, records[2])]
+    # line numbers run on across chunks
+    assert list(query.ifilter(
+        path, field="text", line_numbers=True, chunk_size=2)) == matches
+
+# any iterable of texts
+lines = ["Frodo is a hobbit\n", "Gandalf is a wizard\n"]
+assert list(Query("frodo").ifilter(lines)) == ["Frodo is a hobbit"]
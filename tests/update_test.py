@@ -0,0 +1,89 @@
+from eldar import Index
+
+documents = [
+    "Gandalf is a fictional character in Tolkien's The Lord of the Rings",
+    "Frodo is the main character in The Lord of the Rings",
+    "Ian McKellen interpreted Gandalf in Peter Jackson's movies",
+]
+
+index = Index()
+index.build(documents)
+
+# new documents get the next ids
+print(index.add(["Elijah Wood was cast as Frodo Baggins"]))
+# >>> [3]
+
+# updated documents keep their id
+index.update([0], ["Frodo Baggins is a hobbit"])
+index.delete([1])
+print(index.search("frodo", return_ids=True))
+# >>> [0 3]
+assert list(index.search("frodo", return_ids=True)) == [0, 3]
+assert list(index.search("gandalf", return_ids=True)) == [2]
+
+# prefix wildcards find the terms of every segment
+assert list(index.search('"bag*"', return_ids=True)) == [0, 3]
+assert list(index.search('"h*"', return_ids=True)) == [0]
+
+# merge segments and drop deleted documents from the postings
+index.compact()
+assert list(index.search("frodo", return_ids=True)) == [0, 3]
+
+# cached results of repeated clauses are dropped when documents change
+query = "(frodo OR gandalf) AND NOT hobbit"
+assert list(index.search(query, return_ids=True)) == [2, 3]
+assert list(index.search(query, return_ids=True)) == [2, 3]
+print(index.cache_info())
+assert index.cache_info()["hits"] == 1
+index.delete([3])
+assert list(index.search(query, return_ids=True)) == [2]
+
+# a loaded index keeps its documents on disk: added and updated ones are
+# stored apart, and saved with the others
+import os
+import tempfile
+
+from eldar.storage import DocumentStore
+
+with tempfile.TemporaryDirectory() as tmp:
+    index.save(os.path.join(tmp, "index"))
+    loaded = Index.load(os.path.join(tmp, "index"))
+    loaded.add(["Samwise Gamgee, gardener"])
+    loaded.update([0], ["Frodo Baggins of the Shire"])
+    assert isinstance(loaded.documents, DocumentStore)
+    assert loaded.search("shire OR gardener") == [
+        "Frodo Baggins of the Shire", "Samwise Gamgee, gardener"]
+    loaded.save(os.path.join(tmp, "updated"))
+    reloaded = Index.load(os.path.join(tmp, "updated"))
+    assert list(reloaded.documents) == list(loaded.documents)
+    assert list(reloaded.documents)[-1] == "Samwise Gamgee, gardener"
+    del loaded, reloaded
+
+# asyncio service: concurrent searches and updates, and identical queries in
+# flight evaluated once
+import asyncio
+
+from eldar.service import AsyncIndex
+
+
+async def serve():
+    async with AsyncIndex(index) as service:
+        results = await asyncio.gather(*[
+            service.search(query, return_ids=True) for _ in range(10)])
+        assert all(list(ids) == [2] for ids in results)
+        assert service.coalesced == 9
+        await service.add(["Gandalf the Grey"])
+        assert await service.count("gandalf") == 2
+
+asyncio.run(serve())
+
+# profiles only record the queries of their own thread
+import threading
+
+with index.profile() as profile:
+    thread = threading.Thread(target=index.search, args=("frodo",))
+    thread.start()
+    thread.join()
+    index.search("gandalf")
+assert [query["node"] for query in profile.to_dict()["queries"]] == \
+    ['"gandalf"']